@@ -14,6 +14,9 @@ def create_app(config_name=None):
         config_name = os.getenv('FLASK_CONFIG', 'default')
 
     app = Flask(__name__)
+    # File uploads are spooled to disk past a threshold and size-limited while they arrive
+    from .utils.uploads import SpooledUploadRequest
+    app.request_class = SpooledUploadRequest
     app.config.from_object(config[config_name])
     config[config_name].init_app(app) # Call init_app on the config object itself
 
@@ -25,6 +28,12 @@ def create_app(config_name=None):
     from .api.routes import api_bp as api_blueprint
     app.register_blueprint(api_blueprint, url_prefix='/api') # All api routes will be under /api
 
+    # Build upstream clients and pre-connect before the first request (autoscaled instances)
+    if app.config.get('WARMUP_ON_START'):
+        from .services.warmup import warm_up
+        with app.app_context():
+            warm_up()
+
     # You can add a simple route here for testing if the app is running
     @app.route('/hello')
     def hello():
@@ -1,16 +1,22 @@
 # API routes will be defined here 
 
 from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from io import BytesIO
+import logging
 import os
 
-from app.services import deepgram_service, agent_logic, cv_parser_service
+from app.services import deepgram_service, agent_logic, cv_parser_service, cv_job_service, upstream_scheduler, warmup, degraded_mode, answer_triage, trace_recorder, interview_report
+from app.services.single_flight import llm_single_flight
+from app.utils.compression import compress_response
 from app.utils.logger import get_logger
+from app.utils.uploads import SpooledUpload
 
 logger = get_logger(__name__)
 
 api_bp = Blueprint('api', __name__)
+api_bp.after_request(compress_response) # gzip for clients that send Accept-Encoding: gzip
 
 # Temp storage for CV data for simplicity in this phase. 
 # In a real app, this would be tied to a user session or database.
@@ -20,46 +26,129 @@ current_conversation_id_HACK = "default_user" # HACK for single user testing
 
 ALLOWED_CV_EXTENSIONS = {'txt', 'pdf', 'docx'}
 
+RESPONSE_FORMAT_COMPACT = "compact"
+RESPONSE_FORMAT_VERBOSE = "verbose"
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_CV_EXTENSIONS
 
-@api_bp.route('/interview', methods=['POST'])
-def interview_endpoint():
-    logger.critical("--- /api/interview endpoint CALLED ---")
-    logger.info(f"Received request for /api/interview. Method: {request.method}")
-    
-    # HACK: Using a global conversation ID for now
-    session_id = current_conversation_id_HACK 
+def get_conversation_state(session_id):
     if session_id not in cv_data_store:
         cv_data_store[session_id] = {
             "cv_skills": None, 
             "cv_experience_summary": None,
+            "cv_job_id": None,
             "previous_questions": [],
             "previous_answers": [],
             "previous_scores": [],
-            "current_difficulty": "normal"
+            "current_difficulty": "normal",
+            "report_aggregates": interview_report.new_aggregates()
         }
+    return cv_data_store[session_id]
+
+def apply_finished_cv_job(conversation_state):
+    """Copies skills/experience from a finished background CV job into the conversation state."""
+    job_id = conversation_state.get("cv_job_id")
+    if not job_id or conversation_state["cv_skills"] is not None:
+        return
+    job = cv_job_service.get_cv_job(job_id)
+    if job is None:
+        logger.warning(f"CV job {job_id} not found (expired or unknown). Continuing without CV data.")
+        conversation_state["cv_job_id"] = None
+    elif job["status"] == cv_job_service.STATUS_DONE:
+        conversation_state["cv_skills"] = job["result"].get("skills")
+        conversation_state["cv_experience_summary"] = job["result"].get("experience_summary")
+        logger.info(f"CV job {job_id} finished. Skills picked up for this session: {conversation_state['cv_skills']}")
+    elif job["status"] == cv_job_service.STATUS_FAILED:
+        logger.error(f"CV job {job_id} failed: {job['error']}. Continuing without CV data.")
+        conversation_state["cv_job_id"] = None
+    else:
+        logger.info(f"CV job {job_id} still {job['status']}. Generating question without CV data for now.")
+
+def negotiate_response_format(fields) -> str:
+    """
+    Response format for this request. 'format' (compact/verbose) and 'debug' can be set in the query
+    string or the request body. Verbose responses are only served when VERBOSE_RESPONSES_ALLOWED.
+    """
+    def _field(name):
+        value = request.args.get(name, fields.get(name))
+        return str(value).lower() if value is not None else None
+
+    requested = RESPONSE_FORMAT_VERBOSE if _field('debug') in ('true', '1') else _field('format')
+    if requested not in (RESPONSE_FORMAT_COMPACT, RESPONSE_FORMAT_VERBOSE):
+        requested = current_app.config.get('RESPONSE_FORMAT', RESPONSE_FORMAT_COMPACT)
+    if requested == RESPONSE_FORMAT_VERBOSE and not current_app.config.get('VERBOSE_RESPONSES_ALLOWED', True):
+        logger.debug("Verbose response requested but VERBOSE_RESPONSES_ALLOWED is off. Sending compact.")
+        return RESPONSE_FORMAT_COMPACT
+    return requested
+
+def compact_evaluation(evaluation: dict) -> dict:
+    """Client-facing part of an evaluation: no raw LLM response or triage signals."""
+    compact = {"score": evaluation.get("score"), "feedback": evaluation.get("feedback")}
+    if evaluation.get("refusal"):
+        compact["refusal"] = True
+    return compact
+
+@api_bp.errorhandler(upstream_scheduler.UpstreamBusyError)
+def upstream_busy_handler(e):
+    response = jsonify({"error": "The interview service is busy. Please retry shortly.", "retry_after": e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+@api_bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large_handler(e):
+    # Raised for oversized CV uploads (SpooledUploadRequest) and for requests over MAX_CONTENT_LENGTH
+    logger.warning(f"Request rejected as too large ({request.content_length} bytes): {e.description}")
+    return jsonify({"error": e.description}), 413
+
+@api_bp.route('/interview', methods=['POST'])
+def interview_endpoint():
+    logger.critical("--- /api/interview endpoint CALLED ---")
+    logger.info(f"Received request for /api/interview. Method: {request.method}")
     
-    conversation_state = cv_data_store[session_id]
+    # HACK: Using a global conversation ID for now
+    session_id = current_conversation_id_HACK 
+    conversation_state = get_conversation_state(session_id)
+
+    # Fail fast with a 503 if the LLM queue is already saturated, before touching any state
+    upstream_scheduler.check_admission(upstream_scheduler.UPSTREAM_LLM, upstream_scheduler.PRIORITY_LIVE_TURN)
+
+    # If an upstream call is shed mid-turn, roll the state back so the client can simply retry the turn
+    checkpoint = {key: (list(value) if isinstance(value, list) else value) for key, value in conversation_state.items()}
+    try:
+        with trace_recorder.turn(session_id) as trace, \
+             upstream_scheduler.scheduling(upstream_scheduler.PRIORITY_LIVE_TURN, session_id):
+            response = _interview_turn(conversation_state)
+            if trace is not None:
+                trace.finish(response[1])
+            return response
+    except upstream_scheduler.UpstreamBusyError:
+        conversation_state.clear()
+        conversation_state.update(checkpoint)
+        raise
 
+def _interview_turn(conversation_state):
     # Try to get data as JSON first (for subsequent calls with audio)
     # And from form-data (for initial call with CV + role + audio, or just CV + role)
     data = {}
     role = None
     audio_base64 = None
     cv_file = None
+    cv_job_id = None
 
     if request.content_type.startswith('application/json'):
         data = request.get_json()
         role = data.get('role')
         audio_base64 = data.get('audio')
+        cv_job_id = data.get('cv_job_id')
         logger.debug(f"Request JSON data: { {key: (value[:20] + '...' if isinstance(value, str) and len(value) > 20 else value) for key, value in data.items()} }")
     elif request.content_type.startswith('multipart/form-data'):
         role = request.form.get('role')
         # Audio might also come as a file in form-data, or as base64 in form field
         # For now, assuming audio comes as base64 in form field if CV is also present
         audio_base64 = request.form.get('audio') 
+        cv_job_id = request.form.get('cv_job_id')
         if 'cv' in request.files:
             cv_file = request.files['cv']
             logger.info(f"CV file received: {cv_file.filename}")
@@ -68,21 +157,35 @@ def interview_endpoint():
         logger.warning(f"Unsupported Content-Type: {request.content_type}")
         return jsonify({"error": "Unsupported Content-Type. Must be application/json or multipart/form-data"}), 415
 
+    trace_recorder.record_inputs(role, audio_base64 if isinstance(audio_base64, str) else None, cv_file, cv_job_id)
+    response_format = negotiate_response_format(data or request.form)
+    # Compact responses carry CV data only in the turn it changes
+    cv_before = (conversation_state["cv_skills"], conversation_state["cv_experience_summary"])
+
     if not role or not isinstance(role, str):
         logger.error("Missing or invalid 'role' in request.")
         return jsonify({"error": "Missing or invalid 'role'. It must be a string."}), 400
 
+    # CV uploaded separately via POST /api/cv: link the job and pick up its result once it is done
+    if cv_job_id and conversation_state["cv_skills"] is None:
+        conversation_state["cv_job_id"] = cv_job_id
+    apply_finished_cv_job(conversation_state)
+
     # CV Processing (if a CV file is provided and not already processed)
     if cv_file and cv_file.filename != '' and allowed_file(cv_file.filename):
         if conversation_state["cv_skills"] is None: # Process only if not already done
             filename = secure_filename(cv_file.filename)
             logger.info(f"Processing CV file: {filename}")
             try:
-                file_stream = BytesIO(cv_file.read())
-                cv_text = cv_parser_service.extract_text_from_cv(filename, file_stream)
+                # The upload is already spooled (memory or temp file): hand the stream over without copying it
+                file_stream = cv_file.stream
+                cv_parser_service.check_cv_limits(filename, file_stream, current_app.config.get('MAX_CV_UPLOAD_BYTES'), current_app.config.get('MAX_CV_PAGES'))
+                with trace_recorder.stage("cv_text_extraction"):
+                    cv_text = cv_parser_service.extract_text_from_cv(filename, file_stream)
                 if cv_text:
                     logger.info(f"CV text extracted (length: {len(cv_text)}). Now extracting skills/experience.")
-                    extracted_info = cv_parser_service.extract_skills_and_experience(cv_text)
+                    with trace_recorder.stage("cv_skill_extraction"):
+                        extracted_info = cv_parser_service.extract_skills_and_experience(cv_text)
                     conversation_state["cv_skills"] = extracted_info.get("skills")
                     conversation_state["cv_experience_summary"] = extracted_info.get("experience_summary")
                     logger.info(f"CV skills extracted: {conversation_state['cv_skills']}")
@@ -90,6 +193,11 @@ def interview_endpoint():
                 else:
                     logger.error(f"Could not extract text from CV: {filename}")
                     # Optionally, inform the user in the response that CV processing failed
+            except cv_parser_service.CVRejectedError as e:
+                logger.warning(f"CV file '{filename}' rejected: {e}")
+                return jsonify({"error": str(e)}), 413
+            except upstream_scheduler.UpstreamBusyError:
+                raise # Roll back the turn and answer 503 (see interview_endpoint) instead of dropping the CV
             except Exception as e:
                 logger.error(f"Error processing CV file '{filename}': {e}")
                 # Optionally, inform the user in the response that CV processing failed
@@ -120,13 +228,17 @@ def interview_endpoint():
     # --- MODIFIED AUDIO REQUIREMENT LOGIC END ---
     
     transcript = "" 
+    answer_received = False
+    audio_stats = {}
     if audio_base64 and isinstance(audio_base64, str):
         logger.info("Transcribing audio...")
-        transcript_result = deepgram_service.transcribe_audio(audio_base64)
+        with trace_recorder.stage("transcription"):
+            transcript_result = deepgram_service.transcribe_audio(audio_base64, audio_stats=audio_stats)
         if transcript_result is None:
             logger.error("Audio transcription failed.")
             return jsonify({"error": "Audio transcription failed. Check logs for details."}), 500
         transcript = transcript_result 
+        answer_received = True
         logger.info(f"Transcription successful: '{transcript[:50]}...'")
         # Store answer only if it corresponds to a previous question
         if conversation_state["previous_questions"]:
@@ -140,8 +252,9 @@ def interview_endpoint():
         logger.info("CV processed (or was already processed), no audio in this request. Preparing first question based on CV if available.")
     
     evaluation = None
-    if transcript and conversation_state["previous_questions"]:
-        # Only evaluate if there's a transcript AND a question it's an answer to.
+    question_to_evaluate = None
+    if answer_received and conversation_state["previous_questions"]:
+        # Only evaluate if there's an answer (possibly an empty transcript) AND a question it's an answer to.
         # Ensure we have a question to evaluate against. current_question_for_state might be from a *previous* turn if this is an audio-only submission.
         question_to_evaluate = conversation_state["previous_questions"][-1] 
         # if len(conversation_state["previous_answers"]) == len(conversation_state["previous_questions"]):
@@ -152,16 +265,23 @@ def interview_endpoint():
             # For now, assume the last question is the one being answered.
 
         logger.info(f"Evaluating answer for question: '{question_to_evaluate}'")
-        evaluation = agent_logic.evaluate_answer(
-            question=question_to_evaluate, 
-            transcript=transcript, 
-            conversation_state=conversation_state # Pass full state
-        ) 
+        # Empty, "I don't know" and one-word answers are scored locally, the rest goes to the LLM
+        with trace_recorder.stage("evaluation"):
+            if current_app.config.get('ANSWER_TRIAGE_ENABLED', True):
+                evaluation = answer_triage.triage_answer(question_to_evaluate, transcript, conversation_state, audio_stats)
+            if evaluation is None:
+                evaluation = agent_logic.evaluate_answer(
+                    question=question_to_evaluate, 
+                    transcript=transcript, 
+                    conversation_state=conversation_state # Pass full state
+                ) 
         if evaluation is None:
             logger.error("Failed to evaluate answer (agent_logic returned None unexpectedly).")
             evaluation = {"score": 0, "feedback": "Evaluation failed unexpectedly.", "refusal": True, "raw_llm_response": "Agent logic returned None"}
         else:
-            logger.info(f"Evaluation result: {evaluation}")
+            logger.info(f"Evaluation result: score {evaluation.get('score')}, triaged: {bool(evaluation.get('triaged'))}.")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Full evaluation: {evaluation}")
             # Only append score if it was a valid evaluation (not a refusal or a forced error score)
             if not evaluation.get("refusal", False) and isinstance(evaluation.get("score"), (int, float)) and evaluation.get('score') > 0:
                 conversation_state["previous_scores"].append(evaluation["score"])
@@ -171,26 +291,153 @@ def interview_endpoint():
                 logger.info(f"Invalid or zero score not recorded: {evaluation.get('score')}")
     
     logger.info(f"Generating interview question for role: {role}, using conversation state.")
-    generated_question = agent_logic.generate_interview_question(
-        role=role, 
-        conversation_state=conversation_state # Pass full state
-    )
+    # Falls back to local template questions when the LLM is slow, failing or shed (degraded mode)
+    with trace_recorder.stage("question_generation"):
+        generated_question, question_source = degraded_mode.generate_question(
+            role=role, 
+            conversation_state=conversation_state # Pass full state
+        )
     
     if generated_question is None:
         logger.error("Failed to generate interview question.")
         return jsonify({"error": "Failed to generate interview question. Check logs for details."}), 500
-    logger.info(f"Generated question: '{generated_question}'")
+    logger.info(f"Generated question ({question_source}): '{generated_question}'")
     conversation_state["previous_questions"].append(generated_question)
+    # Nothing below can fail: fold this turn into the running report aggregates
+    interview_report.record_turn(
+        conversation_state, role, generated_question, question_source,
+        evaluated_question=question_to_evaluate,
+        transcript=transcript if answer_received else None,
+        evaluation=evaluation,
+    )
+
+    if response_format == RESPONSE_FORMAT_VERBOSE:
+        response_payload = {
+            "question": generated_question,
+            "question_source": question_source,
+            "transcript": transcript if transcript else ("N/A (CV processed, awaiting first answer)" if conversation_state.get("cv_skills") else "N/A"),
+            "evaluation": evaluation if evaluation else ("N/A (CV processed or no audio/prior question for evaluation)" if conversation_state.get("cv_skills") or not transcript else ("N/A (no audio for evaluation)")),
+            "cv_summary_debug": {"skills": conversation_state.get("cv_skills"), "experience": conversation_state.get("cv_experience_summary")}
+        }
+    else:
+        # Fields without a value are left out instead of filled with placeholder strings
+        response_payload = {"question": generated_question, "question_source": question_source}
+        if answer_received:
+            response_payload["transcript"] = transcript
+        if evaluation:
+            response_payload["evaluation"] = compact_evaluation(evaluation)
+        if (conversation_state["cv_skills"], conversation_state["cv_experience_summary"]) != cv_before:
+            response_payload["cv"] = {"skills": conversation_state["cv_skills"], "experience": conversation_state["cv_experience_summary"]}
+    trace_recorder.record_outputs(
+        question=generated_question,
+        question_source=question_source,
+        transcript=transcript if answer_received else None,
+        audio_stats=audio_stats,
+        score=evaluation.get("score") if isinstance(evaluation, dict) else None,
+        triaged=bool(evaluation.get("triaged")) if isinstance(evaluation, dict) else None,
+        difficulty=conversation_state.get("current_difficulty"),
+        cv_skills=conversation_state.get("cv_skills"),
+    )
+    logger.info(f"Sending {response_format} response (question source: {question_source}, evaluated: {evaluation is not None}).")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Response payload: {response_payload}")
+    return jsonify(response_payload), 200
+
+@api_bp.route('/interview/report', methods=['GET'])
+def interview_report_endpoint():
+    """
+    End-of-interview report from the session's running aggregates. The narrative comes from one
+    cached LLM call on the aggregates (never the transcripts). ?narrative=false skips it.
+    """
+    # HACK: Using a global conversation ID for now (same as /interview)
+    session_id = current_conversation_id_HACK
+    conversation_state = get_conversation_state(session_id)
+    if not conversation_state["previous_questions"]:
+        return jsonify({"error": "No interview in progress for this session."}), 404
 
-    response_payload = {
-        "question": generated_question,
-        "transcript": transcript if transcript else ("N/A (CV processed, awaiting first answer)" if conversation_state.get("cv_skills") else "N/A"),
-        "evaluation": evaluation if evaluation else ("N/A (CV processed or no audio/prior question for evaluation)" if conversation_state.get("cv_skills") or not transcript else ("N/A (no audio for evaluation)")),
-        "cv_summary_debug": {"skills": conversation_state.get("cv_skills"), "experience": conversation_state.get("cv_experience_summary")}
-    }
-    logger.info(f"Sending response: {response_payload}")
+    summary = interview_report.build_summary(conversation_state)
+    response_payload = {"summary": summary}
+    if request.args.get('narrative', 'true').lower() != 'false':
+        narrative, narrative_source = interview_report.generate_narrative(summary, session_id=session_id)
+        response_payload["narrative"] = narrative
+        response_payload["narrative_source"] = narrative_source
     return jsonify(response_payload), 200
 
+@api_bp.route('/cv', methods=['POST'])
+def cv_upload_endpoint():
+    """Accepts a CV and parses it in the background. Returns a job ID immediately (202)."""
+    logger.info("Received request for /api/cv.")
+    if 'cv' not in request.files or request.files['cv'].filename == '':
+        logger.error("Missing 'cv' file in /api/cv request.")
+        return jsonify({"error": "Missing 'cv' file in multipart/form-data request."}), 400
+
+    cv_file = request.files['cv']
+    if not allowed_file(cv_file.filename):
+        logger.warning(f"CV file extension not allowed: {cv_file.filename}")
+        return jsonify({"error": f"Unsupported CV file type. Allowed: {sorted(ALLOWED_CV_EXTENSIONS)}"}), 400
+
+    # HACK: Using a global conversation ID for now (same as /interview)
+    session_id = current_conversation_id_HACK
+    conversation_state = get_conversation_state(session_id)
+
+    # CV parsing is low priority on the LLM upstream: refuse new jobs early when it is saturated
+    upstream_scheduler.check_admission(upstream_scheduler.UPSTREAM_LLM, upstream_scheduler.PRIORITY_CV_PARSING)
+
+    filename = secure_filename(cv_file.filename)
+    file_stream = cv_file.stream
+    try:
+        cv_parser_service.check_cv_limits(filename, file_stream, current_app.config.get('MAX_CV_UPLOAD_BYTES'), current_app.config.get('MAX_CV_PAGES'))
+    except cv_parser_service.CVRejectedError as e:
+        logger.warning(f"CV file '{filename}' rejected: {e}")
+        return jsonify({"error": str(e)}), 413
+
+    if isinstance(file_stream, SpooledUpload):
+        file_stream.keep_open() # The job now owns the spooled upload and releases it when done
+    else:
+        file_stream = BytesIO(cv_file.read())
+    job_id = cv_job_service.submit_cv_job(filename, file_stream, session_id=session_id)
+    # Link the job to the session so the next /interview turn picks up the skills automatically
+    conversation_state["cv_job_id"] = job_id
+    conversation_state["cv_skills"] = None
+    conversation_state["cv_experience_summary"] = None
+
+    return jsonify({"job_id": job_id, "status": cv_job_service.STATUS_QUEUED, "status_url": f"/api/cv/{job_id}"}), 202
+
+@api_bp.route('/cv/<job_id>', methods=['GET'])
+def cv_job_status_endpoint(job_id):
+    job = cv_job_service.get_cv_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired CV job ID."}), 404
+    return jsonify({
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"],
+    }), 200
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return jsonify({
+        "single_flight": {"llm": llm_single_flight.snapshot()},
+        "upstreams": upstream_scheduler.get_stats(),
+        "degraded_mode": degraded_mode.get_monitor().snapshot(),
+        "answer_triage": answer_triage.get_stats(),
+    }), 200
+
+@api_bp.route('/warmup', methods=['GET', 'POST'])
+def warmup_endpoint():
+    """
+    POST runs the warm-up (idempotent). GET is a readiness probe: 200 once the upstream clients
+    were built successfully, 503 (with the last warm-up report, if any) before that.
+    """
+    if request.method == 'POST':
+        report = warmup.warm_up()
+        return jsonify(report), 200 if report["ready"] else 503
+    if warmup.is_warmed_up():
+        return jsonify({"status": "ready"}), 200
+    report = warmup.get_last_report()
+    return jsonify({"status": "failed" if report else "cold", "report": report}), 503
+
 # Example of a simple health check endpoint for the API blueprint
 @api_bp.route('/health', methods=['GET'])
 def health_check():
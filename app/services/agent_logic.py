@@ -1,41 +1,52 @@
 # AI agent logic (question generation, answer evaluation) will be here 
+# openai is imported inside the functions that need it, so importing this module stays cheap at cold start.
 
-import openai
 from flask import current_app
+from app.services import trace_recorder, upstream_scheduler
+from app.services.single_flight import llm_single_flight, make_llm_key
 from app.utils.logger import get_logger
 import os
 import re
+import time
 
 logger = get_logger(__name__)
 
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
 # Store the client instance to avoid reinitialization on every call within the same app context
 _llm_client = None
+# Shared connection pool of the LLM client, kept so warm-up can pre-open a keep-alive connection
+_llm_http_client = None
 
 def get_llm_client():
-    global _llm_client
+    global _llm_client, _llm_http_client
     if _llm_client is not None:
         logger.debug("Returning existing LLM client instance.")
         return _llm_client
 
     logger.info("Initializing LLM client...")
     try:
+        import openai
         api_key = current_app.config.get('DEEPSEEK_API_KEY') # Assuming this is now the OpenRouter Key
         if not api_key:
             logger.error("DEEPSEEK_API_KEY (for OpenRouter) not found in config.")
             return None
 
         # Configuration for OpenRouter
-        base_url = "https://openrouter.ai/api/v1"
+        base_url = OPENROUTER_BASE_URL
         
+        _llm_http_client = openai.DefaultHttpxClient()
         _llm_client = openai.OpenAI(
             base_url=base_url,
             api_key=api_key,
+            http_client=_llm_http_client,
         )
         logger.info(f"LLM client initialized for OpenRouter with key ending in '...{api_key[-4:] if api_key else 'NONE'}'.")
         return _llm_client
     except Exception as e:
         logger.error(f"Error initializing LLM client: {e}")
         _llm_client = None # Ensure client is reset on error
+        _llm_http_client = None
         return None
 
 def _get_openrouter_headers():
@@ -47,7 +58,43 @@ def _get_openrouter_headers():
         "X-Title": app_name,
     }
 
-def generate_interview_question(role: str, conversation_state: dict) -> str | None:
+def create_chat_completion(client, coalesce: bool = False, deadline: float | None = None, **kwargs):
+    """
+    Sends a chat completion through the upstream scheduler. Identical concurrent requests are
+    coalesced into one upstream call when the temperature is low enough to be treated as
+    deterministic (SINGLE_FLIGHT_MAX_TEMPERATURE), or when the caller opts in with coalesce=True.
+    With a deadline (time.monotonic() value) the scheduler wait and the HTTP call share that
+    budget: the wait is capped at the time left, the request times out at the deadline (no retries).
+    """
+    def _call():
+        max_wait = None if deadline is None else deadline - time.monotonic()
+        with upstream_scheduler.slot(upstream_scheduler.UPSTREAM_LLM, max_wait=max_wait):
+            call_client = client
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise upstream_scheduler.UpstreamBusyError(upstream_scheduler.UPSTREAM_LLM, 1)
+                call_client = client.with_options(timeout=remaining, max_retries=0)
+            return call_client.chat.completions.create(**kwargs)
+
+    max_temperature = current_app.config.get('SINGLE_FLIGHT_MAX_TEMPERATURE', 0.3)
+    temperature = kwargs.get('temperature', 1.0)
+    with trace_recorder.upstream_call(upstream_scheduler.UPSTREAM_LLM, model=kwargs.get('model'), temperature=temperature,
+                                      **trace_recorder.prompt_fingerprint(kwargs.get('messages', []))) as call:
+        if not current_app.config.get('SINGLE_FLIGHT_ENABLED', True) or not (coalesce or temperature <= max_temperature):
+            response = _call()
+        else:
+            key_params = {k: v for k, v in kwargs.items() if k not in ('model', 'messages', 'temperature', 'extra_headers')}
+            key = make_llm_key(kwargs['model'], kwargs['messages'], temperature, max_temperature, **key_params)
+            response = llm_single_flight.do(key, _call)
+        call["output"] = response.choices[0].message.content
+    return response
+
+def generate_interview_question(role: str, conversation_state: dict, deadline: float | None = None) -> str | None:
+    """
+    Generates the next question with the LLM. With a deadline (time.monotonic() value) the scheduler
+    wait and the call must both finish by then, otherwise UpstreamBusyError or None is returned.
+    """
     logger.info(f"Generating interview question. Role: {role}.")
     if conversation_state is None: conversation_state = {}
 
@@ -64,8 +111,10 @@ def generate_interview_question(role: str, conversation_state: dict) -> str | No
     if not client:
         logger.error("LLM client not available for question generation.")
         return None
+    import openai # Already loaded by get_llm_client, needed for the APIError handler below
 
     prompt_parts = ["You are an expert interviewer."]
+    is_opening_question = False
     system_message = "You are an expert interviewer. Provide only the question text, in English, no preamble. Be concise."
 
     cv_skills = conversation_state.get('cv_skills', [])
@@ -121,6 +170,7 @@ def generate_interview_question(role: str, conversation_state: dict) -> str | No
              prompt_parts.append("The question can be more complex, nuanced, or require multi-step thinking.")
 
     else: 
+        is_opening_question = True
         prompt_parts.append(f"The candidate is applying for the role of '{role}'.")
         prompt_parts.append("Generate a good, general opening interview question. It could be behavioral or a common role-related question.")
         if current_difficulty == 'easy':
@@ -134,7 +184,10 @@ def generate_interview_question(role: str, conversation_state: dict) -> str | No
     logger.info(f"Using model for question generation: {llm_model_for_question} with difficulty: {current_difficulty}")
 
     try:
-        response = client.chat.completions.create(
+        response = create_chat_completion(
+            client,
+            coalesce=is_opening_question, # Same role, no CV, no history: concurrent sessions can share one question
+            deadline=deadline,
             model=llm_model_for_question, 
             messages=[
                 {"role": "system", "content": system_message},
@@ -183,13 +236,27 @@ def generate_interview_question(role: str, conversation_state: dict) -> str | No
         
         logger.info(f"Generated question: {question}")
         return question
+    except upstream_scheduler.UpstreamBusyError:
+        raise # Let the API layer turn this into a 503 with Retry-After
     except openai.APIError as e:
-        logger.error(f"OpenAI APIError generating interview question: {e.status_code=}, {e.response=}, {e.body=}, {e.request=}")
+        # Connection/timeout errors (e.g. the latency budget set by degraded_mode) carry no status code or response
+        logger.error(f"OpenAI APIError generating interview question: status_code={getattr(e, 'status_code', None)}, response={getattr(e, 'response', None)}, {e.body=}, {e.request=}")
         return None # Fallback to None, API route will handle 500 error
     except Exception as e:
         logger.error(f"Error generating interview question: {e}")
         return None # Fallback to None, API route will handle 500 error
 
+def get_next_difficulty(score: float, question_difficulty: str) -> str:
+    """Difficulty for the next question, based on the score of the answer to the current one."""
+    next_difficulty = question_difficulty
+    if score < 2.5 and question_difficulty != 'easy':
+        next_difficulty = 'easy'
+    elif score >= 4.0 and question_difficulty != 'hard':
+        next_difficulty = 'hard'
+    elif score >= 2.5 and score < 4.0: 
+        next_difficulty = 'normal'
+    return next_difficulty
+
 def evaluate_answer(question: str, transcript: str, conversation_state: dict) -> dict | None:
     logger.info(f"Evaluating answer. Question: '{question}'. Transcript (start): '{transcript[:100]}...'")
     if conversation_state is None: conversation_state = {}
@@ -201,6 +268,7 @@ def evaluate_answer(question: str, transcript: str, conversation_state: dict) ->
     if not client:
         logger.error("LLM client not available for answer evaluation.")
         return None
+    import openai # Already loaded by get_llm_client, needed for the APIError handler below
     
     prompt_parts = [
         f"You are an expert interview evaluator. The candidate was asked the following question for a '{conversation_state.get("role", "generic")}' role: '{question}'",
@@ -225,7 +293,8 @@ def evaluate_answer(question: str, transcript: str, conversation_state: dict) ->
     logger.info(f"Using model for evaluation: {llm_model_for_evaluation}")
 
     try:
-        response = client.chat.completions.create(
+        response = create_chat_completion(
+            client,
             model=llm_model_for_evaluation, 
             messages=[
                 {"role": "system", "content": "You are an expert interview evaluator. Only return the JSON object as specified."},
@@ -236,7 +305,7 @@ def evaluate_answer(question: str, transcript: str, conversation_state: dict) ->
             extra_headers=_get_openrouter_headers()
         )
         evaluation_str = response.choices[0].message.content
-        logger.info(f"Received evaluation from LLM: {evaluation_str}")
+        logger.debug(f"Received evaluation from LLM: {evaluation_str}")
         
         # Check for common refusal phrases
         refusal_phrases = [
@@ -314,14 +383,7 @@ def evaluate_answer(question: str, transcript: str, conversation_state: dict) ->
             evaluation['refusal'] = False # Explicitly set refusal to false for successful parses
             evaluation['raw_llm_response'] = evaluation_str # Include for debugging
 
-            next_difficulty = question_difficulty
-            if evaluation['score'] < 2.5 and question_difficulty != 'easy':
-                next_difficulty = 'easy'
-            elif evaluation['score'] >= 4.0 and question_difficulty != 'hard':
-                next_difficulty = 'hard'
-            elif evaluation['score'] >= 2.5 and evaluation['score'] < 4.0: 
-                next_difficulty = 'normal'
-            
+            next_difficulty = get_next_difficulty(evaluation['score'], question_difficulty)
             conversation_state['current_difficulty_next'] = next_difficulty
             logger.info(f"Score: {evaluation['score']}. Difficulty for NEXT question set to: {next_difficulty}")
 
@@ -334,9 +396,12 @@ def evaluate_answer(question: str, transcript: str, conversation_state: dict) ->
             logger.error(f"Inner error processing evaluation response: {e_inner}. Raw: {evaluation_str} (Cleaned: {cleaned_evaluation_str})")
             return {"score": 1.0, "feedback": f"Error processing evaluation data. Response: {cleaned_evaluation_str[:200]}", "refusal": True, "raw_llm_response": evaluation_str} # Treat other errors as refusal too
 
+    except upstream_scheduler.UpstreamBusyError:
+        raise # Let the API layer turn this into a 503 with Retry-After
     except openai.APIError as e:
-        logger.error(f"OpenAI APIError evaluating answer: {e.status_code=}, {e.response=}, {e.body=}, {e.request=}")
-        return {"score": 0, "feedback": f"Evaluation failed due to API error: {e.status_code}", "refusal": True, "raw_llm_response": str(e.body) if e.body else "API Error"}
+        status_code = getattr(e, 'status_code', None) # None for connection/timeout errors
+        logger.error(f"OpenAI APIError evaluating answer: {status_code=}, response={getattr(e, 'response', None)}, {e.body=}, {e.request=}")
+        return {"score": 0, "feedback": f"Evaluation failed due to API error: {status_code or type(e).__name__}", "refusal": True, "raw_llm_response": str(e.body) if e.body else "API Error"}
     except Exception as e:
         logger.error(f"Error evaluating answer: {e}")
         return {"score": 0, "feedback": "Evaluation failed due to an unexpected error.", "refusal": True, "raw_llm_response": str(e)}
@@ -0,0 +1,114 @@
+# Local fast-path triage: score obviously degenerate answers without an LLM call
+
+import re
+import threading
+
+from app.services.agent_logic import get_next_difficulty
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+FILLER_WORDS = {"um", "umm", "uh", "uhh", "erm", "er", "ah", "hmm", "mm", "like", "basically", "actually",
+                "literally", "so", "well", "okay", "ok", "yeah"}
+FILLER_PHRASES = ["you know", "i mean", "sort of", "kind of"]
+# A non-answer is a transcript made only of these phrases (and filler), e.g. "Um, I don't know, sorry."
+NON_ANSWER_PHRASES = ["i don't know", "i do not know", "i dont know", "no idea", "i have no idea", "not sure",
+                      "i'm not sure", "i am not sure", "i can't answer", "i cannot answer", "i don't remember",
+                      "can't remember", "pass", "skip", "next question", "sorry"]
+STOPWORDS = {"a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "at", "for", "with", "by",
+             "from", "as", "is", "are", "was", "were", "be", "been", "it", "this", "that", "these", "those",
+             "you", "your", "i", "me", "my", "we", "our", "they", "them", "what", "which", "who", "how",
+             "why", "when", "where", "do", "did", "does", "can", "could", "would", "should", "have", "has",
+             "had", "about", "tell", "describe", "explain", "give", "example", "there", "their", "will"}
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'+#.\-]*")
+_NON_ANSWER_PHRASE = "|".join(re.escape(p) for p in sorted(NON_ANSWER_PHRASES, key=len, reverse=True))
+_NON_ANSWER_RE = re.compile(rf"(?:{_NON_ANSWER_PHRASE})(?: (?:{_NON_ANSWER_PHRASE}))*")
+
+_stats_lock = threading.Lock()
+_stats = {"answers": 0, "triaged": 0}
+
+def _words(text: str) -> list[str]:
+    return [w.rstrip(".-'") for w in _WORD_RE.findall(text.lower())]
+
+def mentioned_skills(skills: list[str], text: str) -> list[str]:
+    """Skills that occur in text as whole words, so "Go" or "R" are not found inside "goals" or "really"."""
+    padded = f" {' '.join(_words(text))} "
+    return [skill for skill in skills if (tokens := _words(skill)) and f" {' '.join(tokens)} " in padded]
+
+def _content_words(words: list[str]) -> set[str]:
+    return {w for w in words if w and w not in STOPWORDS and w not in FILLER_WORDS}
+
+def _is_non_answer(words: list[str]) -> bool:
+    """True if nothing but non-answer phrases is left once filler is stripped ("pass", not "pass by reference")."""
+    text = " ".join(w for w in words if w not in FILLER_WORDS)
+    for phrase in FILLER_PHRASES:
+        text = re.sub(rf"\b{phrase}\b", " ", text)
+    return bool(_NON_ANSWER_RE.fullmatch(" ".join(text.split())))
+
+def answer_signals(question: str, transcript: str, cv_skills: list[str] | None, audio_stats: dict | None = None) -> dict:
+    """Cheap features of an answer: length, filler density, keyword overlap and (for WAV) silence ratio."""
+    words = _words(transcript or "")
+    lowered = " ".join(words)
+    filler_count = sum(1 for w in words if w in FILLER_WORDS) + sum(lowered.count(p) for p in FILLER_PHRASES)
+    content = _content_words(words)
+    reference = _content_words(_words(question)) | _content_words(_words(" ".join(cv_skills or [])))
+    return {
+        "word_count": len(words),
+        "content_word_count": len(content),
+        "filler_density": round(filler_count / len(words), 3) if words else 0.0,
+        "keyword_overlap": len(content & reference),
+        "non_answer": _is_non_answer(words),
+        "silence_ratio": (audio_stats or {}).get("silence_ratio"),
+    }
+
+def _verdict(signals: dict) -> tuple[float, str] | None:
+    # Only answers that are degenerate whatever the question was. Short answers ("Binary search.") go to the LLM.
+    words, content = signals["word_count"], signals["content_word_count"]
+    silence = signals["silence_ratio"]
+    if words == 0:
+        return 1.0, "No answer was detected. Try to speak clearly and give a full answer to the question."
+    if silence is not None and silence >= 0.9 and words < 5:
+        return 1.0, "The recording was almost entirely silent. Please answer the question out loud in full sentences."
+    if signals["non_answer"]:
+        return 1.0, "The candidate did not attempt the question. Even a partial answer that explains your reasoning scores better than none."
+    if content == 0:
+        return 1.5, "The answer had no content words. Explain your reasoning and give a concrete example."
+    if signals["filler_density"] >= 0.5 and content < 5:
+        return 1.5, "The answer was mostly filler words with little content. Take a moment to structure your thoughts before answering."
+    return None
+
+def triage_answer(question: str, transcript: str, conversation_state: dict, audio_stats: dict | None = None) -> dict | None:
+    """
+    Returns an evaluation dict (same shape as agent_logic.evaluate_answer) for obviously degenerate
+    answers and sets current_difficulty_next, or None if the answer needs a full LLM evaluation.
+    """
+    signals = answer_signals(question, transcript, conversation_state.get("cv_skills"), audio_stats)
+    verdict = _verdict(signals)
+    with _stats_lock:
+        _stats["answers"] += 1
+        if verdict is not None:
+            _stats["triaged"] += 1
+    if verdict is None:
+        logger.debug(f"Answer triage: substantive answer, sending to LLM evaluation. Signals: {signals}")
+        return None
+
+    score, feedback = verdict
+    question_difficulty = conversation_state.get("current_difficulty", "normal")
+    next_difficulty = get_next_difficulty(score, question_difficulty)
+    conversation_state["current_difficulty_next"] = next_difficulty
+    logger.info(f"Answer triaged locally. Score: {score}. Difficulty for NEXT question set to: {next_difficulty}. Signals: {signals}")
+    return {
+        "score": score,
+        "feedback": feedback,
+        "refusal": False,
+        "raw_llm_response": None,
+        "triaged": True,
+        "triage_signals": signals,
+    }
+
+def get_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["skip_rate"] = round(stats["triaged"] / stats["answers"], 4) if stats["answers"] else 0.0
+    return stats
@@ -0,0 +1,108 @@
+# Background CV ingestion jobs (text extraction + LLM skill extraction off the request path)
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+from flask import current_app
+from app.services import cv_parser_service, upstream_scheduler
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# In-memory job registry. Like cv_data_store in routes.py, this is per-process only.
+_jobs = {}
+_jobs_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is not None:
+        return _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = current_app.config.get('CV_WORKER_COUNT', 2)
+            logger.info(f"Starting CV ingestion worker pool with {workers} workers.")
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cv-worker")
+    return _executor
+
+def _prune_expired_jobs(ttl_seconds: float):
+    cutoff = time.time() - ttl_seconds
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del _jobs[job_id]
+    if expired:
+        logger.debug(f"Pruned {len(expired)} expired CV jobs.")
+
+def _update_job(job_id: str, **fields):
+    with _jobs_lock:
+        if job_id in _jobs:
+            _jobs[job_id].update(fields)
+
+def _run_job(app, job_id: str, filename: str, file_stream: BinaryIO, session_id):
+    with app.app_context(), upstream_scheduler.scheduling(upstream_scheduler.PRIORITY_CV_PARSING, session_id):
+        _update_job(job_id, status=STATUS_PROCESSING, started_at=time.time())
+        logger.info(f"CV job {job_id}: processing '{filename}'.")
+        try:
+            cv_text = cv_parser_service.extract_text_from_cv(filename, file_stream)
+            if not cv_text:
+                _update_job(job_id, status=STATUS_FAILED, error="Could not extract text from CV.", finished_at=time.time())
+                logger.error(f"CV job {job_id}: could not extract text from '{filename}'.")
+                return
+            extracted_info = cv_parser_service.extract_skills_and_experience(cv_text)
+            if cv_parser_service.is_extraction_error(extracted_info):
+                _update_job(job_id, status=STATUS_FAILED, error=extracted_info["experience_summary"], finished_at=time.time())
+                logger.error(f"CV job {job_id}: skill extraction failed for '{filename}': {extracted_info['experience_summary']}")
+                return
+            _update_job(job_id, status=STATUS_DONE, finished_at=time.time(), result={
+                "skills": extracted_info.get("skills"),
+                "experience_summary": extracted_info.get("experience_summary"),
+            })
+            logger.info(f"CV job {job_id}: done, {len(extracted_info.get('skills') or [])} skills extracted.")
+        except upstream_scheduler.UpstreamBusyError as e:
+            logger.warning(f"CV job {job_id}: LLM upstream busy, giving up: {e}")
+            _update_job(job_id, status=STATUS_FAILED, error=f"Upstream busy, retry in {e.retry_after}s.", finished_at=time.time())
+        except Exception as e:
+            logger.error(f"CV job {job_id}: error processing '{filename}': {e}")
+            _update_job(job_id, status=STATUS_FAILED, error="Error during CV processing.", finished_at=time.time())
+        finally:
+            # Spooled uploads were kept open for this job (see routes.cv_upload_endpoint)
+            getattr(file_stream, 'release', file_stream.close)()
+
+def submit_cv_job(filename: str, file_stream: BinaryIO, session_id: str | None = None) -> str:
+    """Queues a CV for background parsing and returns the job ID immediately. The job closes file_stream."""
+    _prune_expired_jobs(current_app.config.get('CV_JOB_TTL_SECONDS', 3600))
+
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "status": STATUS_QUEUED,
+            "filename": filename,
+            "session_id": session_id,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_job, app, job_id, filename, file_stream, session_id)
+    logger.info(f"CV job {job_id} queued for '{filename}'.")
+    return job_id
+
+def get_cv_job(job_id: str) -> dict | None:
+    """Returns a snapshot of the job record, or None if the job is unknown (or expired)."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
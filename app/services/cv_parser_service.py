@@ -1,7 +1,8 @@
 import os
-from io import BytesIO
-import PyPDF2
-from docx import Document
+import re
+import zipfile
+from typing import BinaryIO
+from app.services import upstream_scheduler
 from app.utils.logger import get_logger
 
 # Potentially for LLM-based skill extraction later
@@ -12,6 +13,9 @@ logger = get_logger(__name__)
 
 SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.txt'}
 
+class CVRejectedError(Exception):
+    """Raised when a CV is refused before parsing (too large, too many pages)."""
+
 def get_file_extension(filename: str) -> str | None:
     """Extracts the file extension from a filename."""
     if '.' in filename:
@@ -19,10 +23,54 @@ def get_file_extension(filename: str) -> str | None:
     logger.warning(f"Filename '{filename}' has no extension.")
     return None
 
-def extract_text_from_pdf(file_stream: BytesIO) -> str:
+def _stream_size(file_stream: BinaryIO) -> int:
+    file_stream.seek(0, os.SEEK_END)
+    size = file_stream.tell()
+    file_stream.seek(0)
+    return size
+
+def _docx_page_count(file_stream: BinaryIO) -> int | None:
+    """Page count Word stores in docProps/app.xml, without parsing the document body."""
+    with zipfile.ZipFile(file_stream) as archive:
+        try:
+            app_xml = archive.read('docProps/app.xml').decode('utf-8', errors='ignore')
+        except KeyError:
+            return None
+    match = re.search(r"<Pages>(\d+)</Pages>", app_xml)
+    return int(match.group(1)) if match else None
+
+def check_cv_limits(file_name: str, file_stream: BinaryIO, max_bytes: int | None, max_pages: int | None):
+    """
+    Cheap pre-parse checks on an uploaded CV. Raises CVRejectedError if the file is larger than
+    max_bytes or has more than max_pages pages (PDF page tree, DOCX metadata). Rewinds the stream.
+    """
+    size = _stream_size(file_stream)
+    if max_bytes and size > max_bytes:
+        raise CVRejectedError(f"CV file is too large ({size} bytes, limit {max_bytes}).")
+
+    extension = get_file_extension(file_name)
+    page_count = None
+    try:
+        if max_pages and extension == '.pdf':
+            import PyPDF2
+            page_count = len(PyPDF2.PdfReader(file_stream).pages)
+        elif max_pages and extension == '.docx':
+            page_count = _docx_page_count(file_stream)
+    except Exception as e:
+        # Unreadable files are left to the extractors, which log and fail gracefully
+        logger.warning(f"Could not determine page count of '{file_name}': {e}")
+    finally:
+        file_stream.seek(0)
+
+    if page_count is not None and page_count > max_pages:
+        raise CVRejectedError(f"CV has too many pages ({page_count}, limit {max_pages}).")
+    logger.info(f"CV '{file_name}' passed limits check (size: {size} bytes, pages: {page_count}).")
+
+def extract_text_from_pdf(file_stream: BinaryIO) -> str:
     """Extracts text from a PDF file stream."""
     text = ""
     try:
+        import PyPDF2 # Imported on first use to keep cold starts fast
         reader = PyPDF2.PdfReader(file_stream)
         for page_num in range(len(reader.pages)):
             page = reader.pages[page_num]
@@ -35,10 +83,11 @@ def extract_text_from_pdf(file_stream: BytesIO) -> str:
         raise 
     return text
 
-def extract_text_from_docx(file_stream: BytesIO) -> str:
+def extract_text_from_docx(file_stream: BinaryIO) -> str:
     """Extracts text from a DOCX file stream."""
     text = ""
     try:
+        from docx import Document # Imported on first use to keep cold starts fast
         doc = Document(file_stream)
         for para in doc.paragraphs:
             text += para.text + "\n"
@@ -48,7 +97,7 @@ def extract_text_from_docx(file_stream: BytesIO) -> str:
         raise
     return text
 
-def extract_text_from_txt(file_stream: BytesIO) -> str:
+def extract_text_from_txt(file_stream: BinaryIO) -> str:
     """Extracts text from a TXT file stream."""
     try:
         decoded_text = file_stream.read().decode('utf-8')
@@ -69,7 +118,7 @@ def extract_text_from_txt(file_stream: BytesIO) -> str:
         logger.error(f"Error extracting text from TXT: {e}")
         raise
 
-def extract_text_from_cv(file_name: str, file_stream: BytesIO) -> str | None:
+def extract_text_from_cv(file_name: str, file_stream: BinaryIO) -> str | None:
     """Extracts text from an uploaded CV file based on its extension."""
     extension = get_file_extension(file_name)
 
@@ -93,6 +142,10 @@ def extract_text_from_cv(file_name: str, file_stream: BytesIO) -> str | None:
     return None # Should logically not be reached if extension is supported and no error occurs
 
 # --- Placeholder for LLM-based skill and experience extraction ---
+def is_extraction_error(extracted_info: dict) -> bool:
+    """extract_skills_and_experience reports failures as an empty skill list with an 'Error...' summary."""
+    return not extracted_info.get("skills") and str(extracted_info.get("experience_summary") or "").startswith("Error")
+
 def extract_skills_and_experience(cv_text: str) -> dict:
     logger.info(f"Extracting skills and experience from CV text (length: {len(cv_text)} chars)...")
     
@@ -101,7 +154,7 @@ def extract_skills_and_experience(cv_text: str) -> dict:
     # This creates a potential circular dependency if not handled well.
     # A better approach might be to pass the LLM client instance to this function.
     try:
-        from .agent_logic import get_llm_client # Delayed import to avoid circularity at module load time
+        from .agent_logic import get_llm_client, create_chat_completion # Delayed import to avoid circularity at module load time
         client = get_llm_client()
     except ImportError:
         logger.error("Could not import get_llm_client from agent_logic for CV parsing.")
@@ -138,7 +191,9 @@ def extract_skills_and_experience(cv_text: str) -> dict:
 
         logger.info(f"Sending CV text to LLM ({llm_model_name}) for skill/experience extraction.")
 
-        response = client.chat.completions.create(
+        # Temperature 0.2 is treated as deterministic: identical CVs uploaded concurrently share one LLM call
+        response = create_chat_completion(
+            client,
             model=llm_model_name, 
             messages=[
                 {"role": "system", "content": "You are an expert HR analyst specializing in accurately parsing resumes into structured JSON data. Only return the JSON object."},
@@ -149,7 +204,7 @@ def extract_skills_and_experience(cv_text: str) -> dict:
         )
         
         extracted_data_str = response.choices[0].message.content
-        logger.info(f"Received structured data from LLM for CV: {extracted_data_str}")
+        logger.debug(f"Received structured data from LLM for CV: {extracted_data_str}")
         
         import json
         try:
@@ -167,6 +222,8 @@ def extract_skills_and_experience(cv_text: str) -> dict:
             return {"skills": [], "experience_summary": "Error: Malformed or incomplete data from AI."}
             
         return extracted_data
+    except upstream_scheduler.UpstreamBusyError:
+        raise # Callers decide whether to retry later or continue without CV data
     except Exception as e:
         logger.error(f"Error during LLM-based CV data extraction: {e}")
         # Check for specific API errors if possible (e.g., auth, rate limits from the exception type)
@@ -1,15 +1,32 @@
 # app/services/deepgram_service.py
-from dotenv import load_dotenv
-load_dotenv()   # на всякий случай
-
-import os, asyncio, base64
-from deepgram import DeepgramClient, PrerecordedOptions
+# .env is loaded once by config.py. The Deepgram SDK is imported lazily on first use to keep cold starts fast.
+import os, asyncio, base64, re, sys, wave
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from flask import current_app
+from app.services import trace_recorder, upstream_scheduler
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-print("DEBUG: DEEPGRAM_API_KEY in deepgram_service =", os.environ.get("DEEPGRAM_API_KEY"))
+DEEPGRAM_HOST = "api.deepgram.com"
+
+# Store the client instance to avoid reinitialization on every call (same as agent_logic._llm_client)
+_deepgram_client = None
+
+def get_deepgram_client():
+    global _deepgram_client
+    if _deepgram_client is not None:
+        return _deepgram_client
+
+    api_key = current_app.config.get('DEEPGRAM_API_KEY')
+    if not api_key:
+        logger.error("Deepgram API key not configured.")
+        return None
+    from deepgram import DeepgramClient # Heavy SDK import, deferred until the first transcription/warm-up
+    _deepgram_client = DeepgramClient(api_key)
+    logger.info("Deepgram client initialized.")
+    return _deepgram_client
 
 def _get_deepgram_key():
     # 1) сначала из environment
@@ -23,6 +40,7 @@ def _init_client():
     key = _get_deepgram_key()
     if not key:
         raise RuntimeError("Deepgram API key not configured (checked ENV and current_app)")
+    from deepgram import DeepgramClient
     return DeepgramClient(key)
 
 async def _transcribe_async(audio_bytes: bytes) -> str:
@@ -33,38 +51,202 @@ async def _transcribe_async(audio_bytes: bytes) -> str:
     resp = await dg.transcription.prerecorded(source, options)
     return resp["results"]["channels"][0]["alternatives"][0]["transcript"]
 
-def transcribe_audio(audio_base64_string: str) -> str | None:
+# --- Chunked transcription helpers (long answers) ---
+_SILENCE_WINDOW_SECONDS = 0.02  # Energy is measured over 20 ms windows
+_SILENCE_SEARCH_SECONDS = 3.0   # How far around a target cut point we look for a pause
+_MAX_OVERLAP_WORDS = 25         # Upper bound when de-duplicating words across chunk boundaries
+_MAX_HEAD_SKIP_WORDS = 2        # Leading words of a chunk that may be cut-off fragments of the overlap
+_SILENCE_MAX_WORDS = 5          # Silence ratio is only computed for transcripts shorter than this (the only ones triage checks)
+_SILENCE_LEVEL = 500            # Mean absolute 16-bit amplitude below which a window counts as silence (~-36 dBFS)
+
+def _read_wav(audio_bytes: bytes):
+    """Returns (params, raw_frames) for a WAV payload, or None if it is not a readable WAV."""
+    try:
+        with wave.open(BytesIO(audio_bytes), 'rb') as wav:
+            params = wav.getparams()
+            return params, wav.readframes(params.nframes)
+    except (wave.Error, EOFError) as e:
+        logger.debug(f"Audio is not a readable WAV payload, chunking not possible: {e}")
+        return None
+
+def _quietest_frame(raw: bytes, params, lo: int, hi: int) -> int:
+    """Returns the start frame of the lowest-energy window in [lo, hi). Only 16-bit PCM is analysed."""
+    if params.sampwidth != 2 or sys.byteorder != 'little' or hi <= lo:
+        return (lo + hi) // 2  # No energy analysis possible, cut in the middle of the search range
+
+    samples = memoryview(raw).cast('h')
+    window = max(1, int(params.framerate * _SILENCE_WINDOW_SECONDS))
+    channels = params.nchannels
+    best_frame, best_energy = (lo + hi) // 2, None
+    for start in range(lo, hi - window + 1, window):
+        energy = sum(map(abs, samples[start * channels:(start + window) * channels]))
+        if best_energy is None or energy < best_energy:
+            best_frame, best_energy = start, energy
+    return best_frame
+
+def _split_wav_at_silences(params, raw: bytes, chunk_seconds: float, overlap_seconds: float) -> list[bytes]:
+    """
+    Splits WAV frames into roughly chunk_seconds long segments, cutting at the quietest
+    point near each target boundary. Every segment after the first starts overlap_seconds
+    before its cut point so words on the boundary are never lost.
+    """
+    framerate, nframes = params.framerate, params.nframes
+    chunk_frames = int(chunk_seconds * framerate)
+    overlap_frames = int(overlap_seconds * framerate)
+    search_frames = int(_SILENCE_SEARCH_SECONDS * framerate)
+
+    cuts = []
+    position = 0
+    while True:
+        target = position + chunk_frames
+        if nframes - target < chunk_frames // 4:  # Avoid a tiny trailing chunk, let the last one run long
+            break
+        cut = _quietest_frame(raw, params, max(position + 1, target - search_frames), min(nframes, target + search_frames))
+        cuts.append(cut)
+        position = cut
+
+    frame_bytes = params.sampwidth * params.nchannels
+    segments = []
+    for start, end in zip([0] + cuts, cuts + [nframes]):
+        start = max(0, start - overlap_frames) if start else 0
+        buffer = BytesIO()
+        with wave.open(buffer, 'wb') as out:
+            out.setparams(params)
+            out.writeframes(raw[start * frame_bytes:end * frame_bytes])
+        segments.append(buffer.getvalue())
+    return segments
+
+def _silence_ratio(params, raw: bytes) -> float | None:
+    """Share of 20 ms windows below _SILENCE_LEVEL. Only 16-bit PCM is analysed; every 4th sample is used."""
+    if params.sampwidth != 2 or sys.byteorder != 'little' or not params.nframes:
+        return None
+    samples = memoryview(raw).cast('h')
+    window = max(1, int(params.framerate * _SILENCE_WINDOW_SECONDS)) * params.nchannels
+    stride = 4
+    silent = total = 0
+    for start in range(0, len(samples) - window + 1, window):
+        chunk = samples[start:start + window:stride]
+        total += 1
+        if sum(map(abs, chunk)) < _SILENCE_LEVEL * len(chunk):
+            silent += 1
+    return silent / total if total else None
+
+def _add_silence_ratio(audio_stats: dict | None, wav, transcript: str):
+    """Fills audio_stats['silence_ratio'] after transcription, and only for near-empty transcripts."""
+    if audio_stats is not None and wav and len(transcript.split()) < _SILENCE_MAX_WORDS:
+        audio_stats['silence_ratio'] = _silence_ratio(*wav)
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+def _overlap_length(tail: list[str], head: list[str]) -> int:
+    """
+    Number of leading head words to drop: the longest run of tail's last words found at the start of head.
+    The overlap usually starts mid-word, so the run may begin after up to _MAX_HEAD_SKIP_WORDS fragments
+    (then at least two words have to match, so one common word is not taken for an overlap).
+    """
+    best_k, best_end = 0, 0
+    for skip in range(min(_MAX_HEAD_SKIP_WORDS, len(head) - 1) + 1):
+        for k in range(min(len(tail), len(head) - skip), best_k, -1):
+            if tail[-k:] == head[skip:skip + k] and (skip == 0 or k >= 2):
+                best_k, best_end = k, skip + k
+                break
+    return best_end
+
+def _stitch_transcripts(parts: list[str]) -> str:
+    """Joins chunk transcripts, dropping words repeated because of the overlap between chunks."""
+    stitched = []
+    for part in parts:
+        words = part.split()
+        if stitched and words:
+            normalized_tail = [_normalize_word(w) for w in stitched[-_MAX_OVERLAP_WORDS:]]
+            normalized_head = [_normalize_word(w) for w in words[:_MAX_OVERLAP_WORDS + _MAX_HEAD_SKIP_WORDS]]
+            words = words[_overlap_length(normalized_tail, normalized_head):]
+        stitched.extend(words)
+    return " ".join(stitched)
+
+def _transcribe_bytes(deepgram, audio_bytes: bytes, options, scheduler, priority, session_id) -> str:
+    with scheduler.slot(priority, session_id):
+        response = deepgram.listen.prerecorded.v("1").transcribe_file({"buffer": audio_bytes}, options)
+    return response.results.channels[0].alternatives[0].transcript
+
+def _transcribe_chunked(deepgram, params, raw: bytes, options, config, scheduler) -> str:
+    segments = _split_wav_at_silences(
+        params, raw,
+        chunk_seconds=config.get('TRANSCRIBE_CHUNK_SECONDS', 30),
+        overlap_seconds=config.get('TRANSCRIBE_CHUNK_OVERLAP_SECONDS', 1.5),
+    )
+    max_workers = max(1, min(config.get('TRANSCRIBE_MAX_WORKERS', 4), len(segments)))
+    logger.info(f"Sending audio to Deepgram in {len(segments)} chunks ({max_workers} workers)...")
+    # Worker threads do not inherit the scheduling context, so pass it along explicitly
+    priority, session_id = upstream_scheduler.current_context()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        parts = list(pool.map(
+            lambda segment: _transcribe_bytes(deepgram, segment, options, scheduler, priority, session_id),
+            segments,
+        ))
+    return _stitch_transcripts(parts)
+
+def transcribe_audio(audio_base64_string: str, audio_stats: dict | None = None) -> str | None:
     """
     Transcribes audio from a base64 encoded string using Deepgram.
 
+    WAV answers longer than TRANSCRIBE_CHUNK_THRESHOLD_SECONDS are split at pauses into
+    overlapping chunks that are transcribed concurrently and stitched back together.
+    Shorter or non-WAV audio is sent as a single request.
+
     Args:
         audio_base64_string: The base64 encoded audio data (WAV format recommended).
+        audio_stats: Optional dict, filled with 'duration_seconds' for WAV audio, plus 'silence_ratio'
+            when the transcript is shorter than _SILENCE_MAX_WORDS words.
 
     Returns:
         The transcript text if successful, None otherwise.
     """
-    api_key = current_app.config.get('DEEPGRAM_API_KEY')
-    if not api_key:
-        logger.error("Deepgram API key not configured.")
-        return None
-
     try:
-        deepgram = DeepgramClient(api_key)
+        deepgram = get_deepgram_client()
+        if deepgram is None:
+            return None
+        from deepgram import PrerecordedOptions
         audio_bytes = base64.b64decode(audio_base64_string)
-        payload = {"buffer": audio_bytes}
 
         options = PrerecordedOptions(
             model="nova-2",
             smart_format=True,
         )
 
+        config = current_app.config
+        scheduler = upstream_scheduler.get_scheduler(upstream_scheduler.UPSTREAM_DEEPGRAM)
+        chunking_enabled = config.get('TRANSCRIBE_CHUNKING_ENABLED', True)
+        wav = _read_wav(audio_bytes) if chunking_enabled or audio_stats is not None else None
+        if wav:
+            params, raw = wav
+            duration = params.nframes / params.framerate if params.framerate else 0
+            if audio_stats is not None:
+                audio_stats['duration_seconds'] = duration
+            if chunking_enabled and duration > config.get('TRANSCRIBE_CHUNK_THRESHOLD_SECONDS', 60):
+                try:
+                    with trace_recorder.upstream_call(upstream_scheduler.UPSTREAM_DEEPGRAM, audio_seconds=round(duration, 2), chunked=True) as call:
+                        transcript = _transcribe_chunked(deepgram, params, raw, options, config, scheduler)
+                        call["output"] = transcript
+                    logger.info(f"Chunked transcript received ({duration:.1f}s of audio): {transcript[:50]}...")
+                    _add_silence_ratio(audio_stats, wav, transcript)
+                    return transcript
+                except upstream_scheduler.UpstreamBusyError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Chunked Deepgram transcription failed, retrying as a single request: {e}")
+
         logger.info("Sending audio to Deepgram for transcription...")
-        response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options)
-        
-        transcript = response.results.channels[0].alternatives[0].transcript
+        with trace_recorder.upstream_call(upstream_scheduler.UPSTREAM_DEEPGRAM, audio_bytes=len(audio_bytes), chunked=False) as call:
+            transcript = _transcribe_bytes(deepgram, audio_bytes, options, scheduler, *upstream_scheduler.current_context())
+            call["output"] = transcript
         logger.info(f"Transcript received: {transcript[:50]}...")
+        _add_silence_ratio(audio_stats, wav, transcript)
         return transcript
 
+    except upstream_scheduler.UpstreamBusyError:
+        raise # Let the API layer turn this into a 503 with Retry-After
     except Exception as e:
         logger.error(f"Error during Deepgram transcription: {e}")
         return None
@@ -0,0 +1,204 @@
+# Degraded mode: local, deterministic template questions when the LLM is slow or failing
+
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+from app.services import agent_logic, answer_triage, upstream_scheduler
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+QUESTION_SOURCE_LLM = "llm"
+QUESTION_SOURCE_TEMPLATE = "template"
+
+_OPENING_TEMPLATES = [
+    "Can you walk me through your background and what draws you to the {role} role?",
+    "What do you consider the most important skills for a {role}, and how have you developed them?",
+    "Tell me about a recent project you are proud of that is relevant to the {role} position.",
+]
+
+_SKILL_TEMPLATES = {
+    "easy": [
+        "Can you explain what {skill} is and how you have used it in your work?",
+        "What do you enjoy most about working with {skill}, and why?",
+    ],
+    "normal": [
+        "Describe a project where you used {skill}. What was your role and what was the outcome?",
+        "What challenges have you faced when working with {skill}, and how did you handle them?",
+    ],
+    "hard": [
+        "Tell me about the most complex problem you solved with {skill}. What trade-offs did you consider?",
+        "How would you design a solution for a {role} team that relies heavily on {skill}, and what could go wrong?",
+    ],
+}
+
+_FOLLOW_UP_TEMPLATES = {
+    "easy": [
+        "Let's take a step back on {topic}. Can you describe a simple example from your own experience?",
+        "In your own words, what is the main idea behind {topic}?",
+    ],
+    "normal": [
+        "Can you expand on {topic} with a concrete example from your work?",
+        "Looking back at {topic}, what would you do differently if you faced that situation again?",
+    ],
+    "hard": [
+        "How would your approach to {topic} change if the scale or constraints were ten times bigger?",
+        "What are the main risks in your approach to {topic}, and how would you mitigate them?",
+    ],
+}
+
+def _pick(templates: list[str], index: int, previous_questions: list[str], **fields) -> str:
+    """Deterministically picks a template starting at index, skipping ones already asked."""
+    candidates = [templates[(index + offset) % len(templates)].format(**fields) for offset in range(len(templates))]
+    for candidate in candidates:
+        if candidate not in previous_questions:
+            return candidate
+    return candidates[0]
+
+def generate_template_question(role: str, conversation_state: dict) -> str:
+    """
+    Builds the next question locally from the role, CV skills, current difficulty and the
+    previous question. Same inputs always give the same question.
+    """
+    # Same difficulty hand-over as agent_logic.generate_interview_question
+    current_difficulty = conversation_state.pop('current_difficulty_next', conversation_state.get('current_difficulty', 'normal'))
+    conversation_state['current_difficulty'] = current_difficulty
+    if current_difficulty not in _SKILL_TEMPLATES:
+        current_difficulty = 'normal'
+
+    cv_skills = conversation_state.get('cv_skills') or []
+    previous_questions = conversation_state.get('previous_questions', [])
+    turn = len(previous_questions)
+
+    if not previous_questions:
+        if cv_skills:
+            return _pick(_SKILL_TEMPLATES[current_difficulty], 0, previous_questions, role=role, skill=cv_skills[0])
+        return _pick(_OPENING_TEMPLATES, 0, previous_questions, role=role)
+
+    # Alternate between following up on the previous question and moving to another CV skill
+    if turn % 2 == 1 or not cv_skills:
+        topic = next(iter(answer_triage.mentioned_skills(cv_skills, previous_questions[-1])), "your previous answer")
+        return _pick(_FOLLOW_UP_TEMPLATES[current_difficulty], turn // 2, previous_questions, topic=topic)
+
+    skill = cv_skills[(turn // 2) % len(cv_skills)]
+    return _pick(_SKILL_TEMPLATES[current_difficulty], turn // 2, previous_questions, role=role, skill=skill)
+
+class LLMHealthMonitor:
+    """
+    Tracks recent question-generation outcomes. A call counts as bad if it failed or exceeded the
+    latency budget. When the share of bad calls in the window reaches the threshold, degraded mode
+    is on for a cooldown period. After the cooldown one probe call decides whether to stay degraded.
+    """
+
+    def __init__(self, window_size: int, min_samples: int, error_rate_threshold: float, cooldown_seconds: float):
+        self.min_samples = min_samples
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._outcomes = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self._degraded_until = 0.0
+        self._probing = False
+        self._stats = {"llm_questions": 0, "template_questions": 0, "trips": 0}
+
+    def is_degraded(self) -> bool:
+        with self._lock:
+            if time.monotonic() < self._degraded_until:
+                return True
+            if self._degraded_until:
+                self._probing = True  # Cooldown over, the next LLM call is a probe
+            return False
+
+    def _trip(self, reason: str):
+        self._degraded_until = time.monotonic() + self.cooldown_seconds
+        self._outcomes.clear()
+        self._probing = False
+        self._stats["trips"] += 1
+        logger.warning(f"Degraded mode ON for {self.cooldown_seconds}s: {reason}")
+
+    def record(self, ok: bool):
+        with self._lock:
+            if self._probing:
+                self._probing = False
+                self._degraded_until = 0.0
+                if not ok:
+                    self._trip("probe call after cooldown failed or was too slow")
+                    return
+                logger.info("Degraded mode OFF: probe call succeeded.")
+            self._outcomes.append(ok)
+            bad = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_samples and bad / len(self._outcomes) >= self.error_rate_threshold:
+                self._trip(f"{bad}/{len(self._outcomes)} recent LLM question calls failed or exceeded the latency budget")
+
+    def count_question(self, source: str):
+        with self._lock:
+            key = "llm_questions" if source == QUESTION_SOURCE_LLM else "template_questions"
+            self._stats[key] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "degraded": time.monotonic() < self._degraded_until,
+                "recent_bad": self._outcomes.count(False),
+                "recent_total": len(self._outcomes),
+                **self._stats,
+            }
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def get_monitor() -> LLMHealthMonitor:
+    global _monitor
+    if _monitor is not None:
+        return _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            config = current_app.config
+            _monitor = LLMHealthMonitor(
+                window_size=config.get('DEGRADED_WINDOW_SIZE', 10),
+                min_samples=config.get('DEGRADED_MIN_SAMPLES', 4),
+                error_rate_threshold=config.get('DEGRADED_ERROR_RATE_THRESHOLD', 0.5),
+                cooldown_seconds=config.get('DEGRADED_COOLDOWN_SECONDS', 30),
+            )
+    return _monitor
+
+def generate_question(role: str, conversation_state: dict) -> tuple[str, str]:
+    """
+    Returns (question, source). Uses the LLM if it answers within QUESTION_LATENCY_BUDGET_SECONDS,
+    including the wait for an upstream slot, and the local template engine when the LLM fails, misses
+    the deadline, is shed by the scheduler, or degraded mode is on.
+    """
+    config = current_app.config
+    if not config.get('DEGRADED_MODE_ENABLED', True):
+        return agent_logic.generate_interview_question(role=role, conversation_state=conversation_state), QUESTION_SOURCE_LLM
+
+    monitor = get_monitor()
+    if monitor.is_degraded():
+        logger.info("Degraded mode is on. Using a template question.")
+        question = generate_template_question(role, conversation_state)
+        monitor.count_question(QUESTION_SOURCE_TEMPLATE)
+        return question, QUESTION_SOURCE_TEMPLATE
+
+    budget = config.get('QUESTION_LATENCY_BUDGET_SECONDS', 8)
+    started = time.monotonic()
+    try:
+        question = agent_logic.generate_interview_question(role=role, conversation_state=conversation_state, deadline=started + budget)
+    except upstream_scheduler.UpstreamBusyError as e:
+        logger.warning(f"LLM upstream busy or no slot within the latency budget during question generation ({e}).")
+        question = None
+    elapsed = time.monotonic() - started
+    if question is not None and elapsed > budget:
+        # E.g. a coalesced call led by a request with a later deadline: the answer came too late for this turn
+        logger.warning(f"LLM question generation took {elapsed:.2f}s, over the {budget}s budget. Discarding it.")
+        question = None
+    monitor.record(question is not None)
+
+    if question is None:
+        logger.warning(f"LLM question generation failed after {elapsed:.2f}s. Falling back to a template question.")
+        question = generate_template_question(role, conversation_state)
+        monitor.count_question(QUESTION_SOURCE_TEMPLATE)
+        return question, QUESTION_SOURCE_TEMPLATE
+
+    monitor.count_question(QUESTION_SOURCE_LLM)
+    return question, QUESTION_SOURCE_LLM
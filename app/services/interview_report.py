@@ -0,0 +1,258 @@
+# End-of-interview report: running per-session aggregates, plus one cached LLM call for the narrative
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from app.services import agent_logic, answer_triage, degraded_mode, upstream_scheduler
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+NARRATIVE_SOURCE_LLM = "llm"
+NARRATIVE_SOURCE_CACHE = "cache"
+NARRATIVE_SOURCE_TEMPLATE = "template"
+
+TREND_THRESHOLD = 0.25 # Score change per answer above which the trend is "improving"/"declining"
+_QUESTION_PREVIEW_CHARS = 160
+
+_narrative_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def new_aggregates() -> dict:
+    return {
+        "role": None,
+        "questions_asked": 0,
+        "answers": 0,
+        "triaged_answers": 0,
+        "refusals": 0,
+        "template_questions": 0,
+        "score_count": 0,
+        "score_sum": 0.0,
+        "score_index_sum": 0.0, # sum(i * score_i) with i = 0, 1, ... for the least-squares trend
+        "score_min": None,
+        "score_max": None,
+        "first_score": None,
+        "last_score": None,
+        "strongest": None,
+        "weakest": None,
+        "difficulty_counts": {},
+        "difficulty_transitions": {},
+        "last_difficulty": None,
+        "skill_mentions": {},
+    }
+
+def is_valid_score(evaluation) -> bool:
+    """Same rule as /api/interview uses for previous_scores: no refusals, numeric and above zero."""
+    return isinstance(evaluation, dict) and not evaluation.get("refusal", False) \
+        and isinstance(evaluation.get("score"), (int, float)) and evaluation["score"] > 0
+
+def _add_score(aggregates: dict, score: float, question: str):
+    i = aggregates["score_count"]
+    aggregates["score_count"] += 1
+    aggregates["score_sum"] += score
+    aggregates["score_index_sum"] += i * score
+    if aggregates["first_score"] is None:
+        aggregates["first_score"] = score
+    aggregates["last_score"] = score
+    entry = {"score": score, "question": question[:_QUESTION_PREVIEW_CHARS]}
+    if aggregates["score_max"] is None or score > aggregates["score_max"]:
+        aggregates["score_max"] = score
+        aggregates["strongest"] = entry
+    if aggregates["score_min"] is None or score < aggregates["score_min"]:
+        aggregates["score_min"] = score
+        aggregates["weakest"] = entry
+
+def record_turn(conversation_state: dict, role: str, question: str, question_source: str,
+                evaluated_question: str | None = None, transcript: str | None = None, evaluation: dict | None = None):
+    """
+    Updates the session's report aggregates with one finished turn. Cost is O(number of CV skills),
+    independent of the interview length. Call it once the turn can no longer fail.
+    """
+    aggregates = conversation_state["report_aggregates"]
+    aggregates["role"] = role
+    aggregates["questions_asked"] += 1
+    if question_source != degraded_mode.QUESTION_SOURCE_LLM:
+        aggregates["template_questions"] += 1
+
+    # current_difficulty is the difficulty the new question was generated at
+    difficulty = conversation_state.get("current_difficulty", "normal")
+    counts = aggregates["difficulty_counts"]
+    counts[difficulty] = counts.get(difficulty, 0) + 1
+    previous = aggregates["last_difficulty"]
+    if previous is not None and previous != difficulty:
+        transition = f"{previous}->{difficulty}"
+        aggregates["difficulty_transitions"][transition] = aggregates["difficulty_transitions"].get(transition, 0) + 1
+    aggregates["last_difficulty"] = difficulty
+
+    if transcript is not None:
+        aggregates["answers"] += 1
+    if isinstance(evaluation, dict):
+        if evaluation.get("triaged"):
+            aggregates["triaged_answers"] += 1
+        if evaluation.get("refusal"):
+            aggregates["refusals"] += 1
+        if is_valid_score(evaluation):
+            _add_score(aggregates, float(evaluation["score"]), evaluated_question or "")
+
+    # A skill counts as covered once it comes up (as whole words) in a question or an answer
+    mentions = aggregates["skill_mentions"]
+    for skill in answer_triage.mentioned_skills(conversation_state.get("cv_skills") or [], f"{question} {transcript or ''}"):
+        mentions[skill] = mentions.get(skill, 0) + 1
+
+def _score_trend(aggregates: dict) -> float | None:
+    """Least-squares slope of score over answer index, from the running sums."""
+    n = aggregates["score_count"]
+    if n < 2:
+        return None
+    sum_x = n * (n - 1) / 2
+    sum_xx = (n - 1) * n * (2 * n - 1) / 6
+    slope = (n * aggregates["score_index_sum"] - sum_x * aggregates["score_sum"]) / (n * sum_xx - sum_x ** 2)
+    return round(slope, 3)
+
+def build_summary(conversation_state: dict) -> dict:
+    """The report's structured part, computed from the aggregates only (no transcripts)."""
+    aggregates = conversation_state.get("report_aggregates") or new_aggregates()
+    n = aggregates["score_count"]
+    trend = _score_trend(aggregates)
+    if trend is None:
+        trend_label = None
+    elif trend >= TREND_THRESHOLD:
+        trend_label = "improving"
+    elif trend <= -TREND_THRESHOLD:
+        trend_label = "declining"
+    else:
+        trend_label = "steady"
+
+    cv_skills = conversation_state.get("cv_skills") or []
+    covered = [skill for skill in cv_skills if aggregates["skill_mentions"].get(skill)]
+    return {
+        "role": aggregates["role"],
+        "questions_asked": aggregates["questions_asked"],
+        "answers": aggregates["answers"],
+        "scored_answers": n,
+        "triaged_answers": aggregates["triaged_answers"],
+        "refusals": aggregates["refusals"],
+        "template_questions": aggregates["template_questions"],
+        "score": {
+            "mean": round(aggregates["score_sum"] / n, 2) if n else None,
+            "min": aggregates["score_min"],
+            "max": aggregates["score_max"],
+            "first": aggregates["first_score"],
+            "last": aggregates["last_score"],
+            "trend_per_answer": trend,
+            "trend": trend_label,
+        },
+        "difficulty": {
+            "final": aggregates["last_difficulty"],
+            "counts": dict(aggregates["difficulty_counts"]),
+            "transitions": dict(aggregates["difficulty_transitions"]),
+        },
+        "skills": {
+            "covered": covered,
+            "not_covered": [skill for skill in cv_skills if skill not in covered],
+            "coverage": round(len(covered) / len(cv_skills), 2) if cv_skills else None,
+        },
+        "strongest_answer": aggregates["strongest"],
+        "weakest_answer": aggregates["weakest"],
+    }
+
+def generate_template_narrative(summary: dict) -> str:
+    """Deterministic narrative from the summary, used when the LLM is unavailable or disabled."""
+    role = summary["role"] or "the role"
+    score = summary["score"]
+    if not summary["scored_answers"]:
+        return f"The interview for {role} ended before any answer could be scored ({summary['questions_asked']} questions asked)."
+
+    sentences = [f"Over {summary['questions_asked']} questions for {role}, the candidate averaged {score['mean']} out of 5 "
+                 f"(range {score['min']}-{score['max']})."]
+    if score["trend"]:
+        sentences.append(f"Performance was {score['trend']} over the interview, from {score['first']} to {score['last']}.")
+    if summary["difficulty"]["final"]:
+        sentences.append(f"The interview finished at {summary['difficulty']['final']} difficulty.")
+    if summary["strongest_answer"] and summary["scored_answers"] > 1:
+        sentences.append(f"Strongest answer: \"{summary['strongest_answer']['question']}\" ({summary['strongest_answer']['score']}).")
+        sentences.append(f"Weakest answer: \"{summary['weakest_answer']['question']}\" ({summary['weakest_answer']['score']}).")
+    skills = summary["skills"]
+    if skills["coverage"] is not None:
+        sentences.append(f"{len(skills['covered'])} of {len(skills['covered']) + len(skills['not_covered'])} CV skills came up"
+                         + (f"; not discussed: {', '.join(skills['not_covered'][:5])}." if skills["not_covered"] else "."))
+    if summary["triaged_answers"]:
+        sentences.append(f"{summary['triaged_answers']} answers were empty, filler-only or non-answers.")
+    return " ".join(sentences)
+
+def _summary_digest(summary: dict) -> str:
+    return hashlib.sha256(json.dumps(summary, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def _cache_get(digest: str) -> str | None:
+    with _cache_lock:
+        narrative = _narrative_cache.get(digest)
+        if narrative is not None:
+            _narrative_cache.move_to_end(digest)
+        return narrative
+
+def _cache_put(digest: str, narrative: str):
+    max_size = current_app.config.get('REPORT_NARRATIVE_CACHE_SIZE', 256)
+    with _cache_lock:
+        _narrative_cache[digest] = narrative
+        _narrative_cache.move_to_end(digest)
+        while len(_narrative_cache) > max_size:
+            _narrative_cache.popitem(last=False)
+
+def _generate_llm_narrative(summary: dict) -> str | None:
+    client = agent_logic.get_llm_client()
+    if not client:
+        logger.error("LLM client not available for the interview report.")
+        return None
+
+    prompt = (
+        "Write a short end-of-interview report (4-6 sentences) for a hiring manager, based ONLY on the "
+        "following aggregated interview data. Mention overall performance, the score trend, how difficulty "
+        "evolved, skill coverage, and one strength and one area to improve. No preamble, no headings.\n\n"
+        f"Interview data (JSON): {json.dumps(summary, separators=(',', ':'))}"
+    )
+    llm_model_for_report = "deepseek/deepseek-chat-v3-0324:free"
+    try:
+        # Temperature 0.2 is treated as deterministic: concurrent requests for the same report share one call
+        response = agent_logic.create_chat_completion(
+            client,
+            model=llm_model_for_report,
+            messages=[
+                {"role": "system", "content": "You are an expert interviewer writing concise, factual interview reports."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            max_tokens=350,
+            extra_headers=agent_logic._get_openrouter_headers()
+        )
+        narrative = (response.choices[0].message.content or "").strip()
+        return narrative or None
+    except upstream_scheduler.UpstreamBusyError as e:
+        logger.warning(f"LLM upstream busy during report generation ({e}). Using the template narrative.")
+        return None
+    except Exception as e:
+        logger.error(f"Error generating interview report narrative: {e}")
+        return None
+
+def generate_narrative(summary: dict, session_id=None) -> tuple[str, str]:
+    """
+    Returns (narrative, source). One LLM call per distinct summary: results are cached by the
+    summary's content, so asking again without a new turn is free. Falls back to the template.
+    """
+    if not current_app.config.get('REPORT_NARRATIVE_ENABLED', True) or not summary["scored_answers"]:
+        return generate_template_narrative(summary), NARRATIVE_SOURCE_TEMPLATE
+
+    digest = _summary_digest(summary)
+    narrative = _cache_get(digest)
+    if narrative is not None:
+        logger.info("Interview report narrative served from cache.")
+        return narrative, NARRATIVE_SOURCE_CACHE
+
+    with upstream_scheduler.scheduling(upstream_scheduler.PRIORITY_BATCH, session_id):
+        narrative = _generate_llm_narrative(summary)
+    if narrative is None:
+        return generate_template_narrative(summary), NARRATIVE_SOURCE_TEMPLATE
+    _cache_put(digest, narrative)
+    return narrative, NARRATIVE_SOURCE_LLM
@@ -0,0 +1,91 @@
+# Request coalescing: concurrent identical calls share one upstream request
+
+import hashlib
+import json
+import threading
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Runs fn once per key among concurrent callers: the first caller (leader) executes it,
+    callers arriving while it is in flight wait and get the same result (or exception).
+    Nothing is cached once the call has finished.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"leader_calls": 0, "coalesced_hits": 0, "shared_errors": 0}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["coalesced_hits"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats["leader_calls"] += 1
+                leader = True
+
+        if not leader:
+            logger.info(f"Single-flight '{self.name}': joining in-flight call {key[:12]}.")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is not None and call.waiters:
+                    self._stats["shared_errors"] += call.waiters
+            call.done.set()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        total = stats["leader_calls"] + stats["coalesced_hits"]
+        stats["hit_rate"] = round(stats["coalesced_hits"] / total, 4) if total else 0.0
+        return stats
+
+def _normalize_text(text) -> str:
+    return " ".join(str(text).split())
+
+def make_llm_key(model: str, messages: list, temperature: float, deterministic_max_temperature: float, **params) -> str:
+    """
+    Key for an LLM request: whitespace-normalized messages, model, temperature class and any
+    other generation parameters. Temperatures up to deterministic_max_temperature share one class.
+    """
+    temperature_class = "deterministic" if temperature <= deterministic_max_temperature else f"sampled:{temperature}"
+    payload = {
+        "model": model,
+        "temperature_class": temperature_class,
+        "messages": [(m.get("role"), _normalize_text(m.get("content", ""))) for m in messages],
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# Shared by every LLM call site (agent_logic, cv_parser_service)
+llm_single_flight = SingleFlight("llm")
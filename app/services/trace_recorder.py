@@ -0,0 +1,195 @@
+# Opt-in recording of /api/interview turns to JSONL, for offline replay (see benchmarks/replay_traces.py)
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app
+from app.services import upstream_scheduler
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+TRACE_VERSION = 1
+REDACTION_HASH = "hash"      # Raw inputs (audio, CV, session id) hashed. Transcripts and LLM text kept for replay.
+REDACTION_STRICT = "strict"  # Also replaces all free text with placeholders of the same word count.
+
+_current_turn = ContextVar("trace_turn", default=None)
+_write_lock = threading.Lock()
+
+def _sha256(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def _placeholder(text: str) -> str:
+    return " ".join("w" for _ in str(text).split())
+
+def _redact_json_strings(value):
+    if isinstance(value, str):
+        return _placeholder(value)
+    if isinstance(value, list):
+        return [_redact_json_strings(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _redact_json_strings(v) for k, v in value.items()}
+    return value
+
+def redact_text(text: str | None, redaction: str) -> str | None:
+    """Keeps text as-is in hash mode. In strict mode keeps only its shape (word count, JSON structure)."""
+    if text is None or redaction != REDACTION_STRICT:
+        return text
+    try:
+        return json.dumps(_redact_json_strings(json.loads(text)))
+    except (ValueError, TypeError):
+        return _placeholder(text)
+
+class TurnTrace:
+    """Everything recorded for one /api/interview turn."""
+
+    def __init__(self, session_id: str, redaction: str):
+        self.redaction = redaction
+        self.started = time.perf_counter()
+        self.record = {
+            "trace_version": TRACE_VERSION,
+            "session": _sha256(str(session_id))[:16],
+            "ts": time.time(),
+            "inputs": {},
+            "upstream_calls": [],
+            "stages_ms": {},
+            "outputs": {},
+        }
+        self._lock = threading.Lock()
+
+    def _offset_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def set_inputs(self, **inputs):
+        self.record["inputs"].update(inputs)
+
+    def set_outputs(self, **outputs):
+        self.record["outputs"].update(outputs)
+
+    def add_upstream_call(self, upstream: str, started_offset_ms: float, duration_ms: float, ok: bool, **details):
+        call = {"upstream": upstream, "start_ms": started_offset_ms, "duration_ms": round(duration_ms, 1), "ok": ok, **details}
+        if "output" in call:
+            call["output"] = redact_text(call["output"], self.redaction)
+        with self._lock:
+            self.record["upstream_calls"].append(call)
+
+    def add_stage(self, name: str, duration_ms: float):
+        stages = self.record["stages_ms"]
+        stages[name] = round(stages.get(name, 0.0) + duration_ms, 1)
+
+    def finish(self, status_code: int) -> dict:
+        self.record["outputs"]["status"] = status_code
+        self.record["stages_ms"]["total"] = self._offset_ms()
+        return self.record
+
+def _write(record: dict):
+    trace_dir = current_app.config.get('TRACE_DIR', 'traces')
+    os.makedirs(trace_dir, exist_ok=True)
+    path = os.path.join(trace_dir, time.strftime("turns-%Y%m%d.jsonl", time.gmtime(record["ts"])))
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+@contextmanager
+def turn(session_id):
+    """
+    Records the enclosed /api/interview turn when TRACE_RECORDING_ENABLED is set. Yields the
+    TurnTrace (or None when recording is off). The caller reports the HTTP status via finish().
+    """
+    if not current_app.config.get('TRACE_RECORDING_ENABLED', False):
+        yield None
+        return
+    trace = TurnTrace(session_id, current_app.config.get('TRACE_REDACTION', REDACTION_HASH))
+    token = _current_turn.set(trace)
+    try:
+        yield trace
+    except upstream_scheduler.UpstreamBusyError:
+        trace.finish(503)  # Shed by the scheduler, the API layer answers 503 with Retry-After
+        raise
+    finally:
+        _current_turn.reset(token)
+        if "status" not in trace.record["outputs"]:
+            trace.finish(500)  # The turn raised
+        try:
+            _write(trace.record)
+        except Exception as e:
+            logger.error(f"Could not write turn trace: {e}")
+
+def current_turn() -> TurnTrace | None:
+    return _current_turn.get()
+
+@contextmanager
+def stage(name: str):
+    """Adds the time spent in the block to the current turn's stage breakdown (no-op when not recording)."""
+    trace = _current_turn.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, (time.perf_counter() - started) * 1000)
+
+@contextmanager
+def upstream_call(upstream: str, **details):
+    """
+    Times one upstream call for the current turn. The block may add fields (e.g. 'output') to the
+    yielded dict. No-op when not recording.
+    """
+    trace = _current_turn.get()
+    call = dict(details)
+    if trace is None:
+        yield call
+        return
+    started_offset = trace._offset_ms()
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield call
+        ok = True
+    except Exception as e:
+        call["error"] = type(e).__name__
+        raise
+    finally:
+        trace.add_upstream_call(upstream, started_offset, (time.perf_counter() - started) * 1000, ok, **call)
+
+def record_inputs(role: str | None, audio_base64: str | None, cv_file=None, cv_job_id: str | None = None):
+    """Hashes/summarizes the raw request inputs of the current turn (no-op when not recording)."""
+    trace = _current_turn.get()
+    if trace is None:
+        return
+    inputs = {"role": role, "cv_job_id": bool(cv_job_id)}
+    if audio_base64:
+        inputs["audio"] = {"sha256": _sha256(audio_base64), "base64_chars": len(audio_base64)}
+    if cv_file is not None and cv_file.filename:
+        stream = cv_file.stream
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        inputs["cv"] = {"extension": os.path.splitext(cv_file.filename)[1].lower(), "bytes": stream.tell()}
+        stream.seek(position)
+    trace.set_inputs(**inputs)
+
+def record_outputs(**outputs):
+    trace = _current_turn.get()
+    if trace is None:
+        return
+    for key in ("question", "transcript", "feedback"):
+        if key in outputs:
+            outputs[key] = redact_text(outputs[key], trace.redaction)
+    if "cv_skills" in outputs and trace.redaction == REDACTION_STRICT:
+        outputs["cv_skills"] = [_placeholder(s) for s in outputs["cv_skills"] or []]
+    trace.set_outputs(**outputs)
+
+def prompt_fingerprint(messages: list) -> dict:
+    text = "\n".join(str(m.get("content", "")) for m in messages)
+    return {"prompt_sha256": _sha256(re.sub(r"\s+", " ", text).strip())[:16], "prompt_chars": len(text)}
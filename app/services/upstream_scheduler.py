@@ -0,0 +1,285 @@
+# Admission control and fair scheduling for upstream calls (OpenRouter LLM, Deepgram)
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Priority classes, lower value is served first
+PRIORITY_LIVE_TURN = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_CV_PARSING = 2
+PRIORITY_BATCH = 3
+PRIORITIES = (PRIORITY_LIVE_TURN, PRIORITY_PREFETCH, PRIORITY_CV_PARSING, PRIORITY_BATCH)
+PRIORITY_NAMES = {
+    PRIORITY_LIVE_TURN: "live_turn",
+    PRIORITY_PREFETCH: "prefetch",
+    PRIORITY_CV_PARSING: "cv_parsing",
+    PRIORITY_BATCH: "batch",
+}
+
+UPSTREAM_LLM = "llm"
+UPSTREAM_DEEPGRAM = "deepgram"
+
+# Priority/session of the work running in the current thread (set by routes and background workers)
+_priority_var = ContextVar("upstream_priority", default=PRIORITY_BATCH)
+_session_var = ContextVar("upstream_session", default=None)
+
+class UpstreamBusyError(Exception):
+    """Raised when an upstream call is shed (queue full) or waited longer than allowed for a slot."""
+
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(f"Upstream '{upstream}' is busy, retry after {retry_after}s.")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Classic token bucket. A rate of 0 (or less) means unlimited."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def has_token(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        return self.tokens >= 1
+
+    def take(self, now: float):
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+    def seconds_until_tokens(self, count: float, now: float) -> float:
+        """Time until count tokens will have accumulated (ignoring the capacity)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return max(0.0, (count - self.tokens) / self.rate)
+
+    def seconds_until_token(self, now: float) -> float:
+        if self.has_token(now):
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class _Waiter:
+    __slots__ = ("priority", "session_id", "granted")
+
+    def __init__(self, priority: int, session_id):
+        self.priority = priority
+        self.session_id = session_id
+        self.granted = False
+
+class UpstreamScheduler:
+    """
+    Gatekeeper for one upstream. Calls wait for a concurrency slot and a rate-limit token.
+    Waiting calls are served strictly by priority class, and round-robin across sessions
+    within a class, so one session's burst cannot starve the others. One slot is kept
+    for live turns. Lower classes are shed first when the queue grows.
+    """
+
+    def __init__(self, name: str, rate_per_second: float, burst: float, max_concurrency: int,
+                 max_queue: int, max_wait_seconds: float, reserved_live_slots: int = 1):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(1, max_queue)
+        self.max_wait_seconds = max_wait_seconds
+        self.reserved_live_slots = min(reserved_live_slots, self.max_concurrency - 1)
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._cond = threading.Condition()
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}  # priority -> session -> deque[_Waiter]
+        self._queued = 0
+        self._in_flight = 0
+        self._stats = {"granted": 0, "rejected": 0, "timed_out": 0, "total_wait_seconds": 0.0}
+
+    # --- internals, all called with self._cond held ---
+
+    def _queue_limit(self, priority: int) -> int:
+        return max(1, self.max_queue >> priority)  # live: max_queue, prefetch: 1/2, cv: 1/4, batch: 1/8
+
+    def _retry_after(self) -> int:
+        rate = self._bucket.rate if self._bucket.rate > 0 else self.max_concurrency
+        return max(1, min(60, math.ceil((self._queued + 1) / rate)))
+
+    def _estimated_wait(self, priority: int) -> float:
+        """Seconds until the rate limit lets a new request of this priority through (equal and higher classes go first)."""
+        ahead = sum(len(waiters) for p in PRIORITIES if p <= priority for waiters in self._queues[p].values())
+        return self._bucket.seconds_until_tokens(ahead + 1, time.monotonic())
+
+    def _admit_or_raise(self, priority: int, max_wait: float):
+        # Shed right away when the queue is full or the rate limit cannot serve us within max_wait,
+        # instead of letting the caller wait the whole max_wait for a 503
+        estimated_wait = self._estimated_wait(priority)
+        if self._queued >= self._queue_limit(priority) or estimated_wait > max_wait:
+            self._stats["rejected"] += 1
+            retry_after = self._retry_after()
+            logger.warning(f"Upstream '{self.name}' shedding {PRIORITY_NAMES[priority]} request "
+                           f"(queued: {self._queued}, in flight: {self._in_flight}, estimated wait: {estimated_wait:.1f}s). "
+                           f"Retry after {retry_after}s.")
+            raise UpstreamBusyError(self.name, retry_after)
+
+    def _next_candidate(self):
+        for priority in PRIORITIES:
+            sessions = self._queues[priority]
+            if not sessions:
+                continue
+            if priority != PRIORITY_LIVE_TURN and \
+               self._in_flight >= self.max_concurrency - self.reserved_live_slots:
+                return None  # Remaining slots are reserved for live turns, lower classes wait
+            return priority, next(iter(sessions))
+        return None
+
+    def _dispatch(self):
+        granted_any = False
+        while self._in_flight < self.max_concurrency:
+            candidate = self._next_candidate()
+            now = time.monotonic()
+            if candidate is None or not self._bucket.has_token(now):
+                break
+            priority, session_id = candidate
+            sessions = self._queues[priority]
+            waiter = sessions[session_id].popleft()
+            if sessions[session_id]:
+                sessions.move_to_end(session_id)  # Round-robin: this session goes behind the others
+            else:
+                del sessions[session_id]
+            self._bucket.take(now)
+            self._queued -= 1
+            self._in_flight += 1
+            waiter.granted = True
+            granted_any = True
+        if granted_any:
+            self._cond.notify_all()
+
+    def _remove(self, waiter: _Waiter):
+        sessions = self._queues[waiter.priority]
+        waiters = sessions.get(waiter.session_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del sessions[waiter.session_id]
+            self._queued -= 1
+
+    # --- public API ---
+
+    def check_admission(self, priority: int):
+        """Raises UpstreamBusyError right away if a request of this priority would be shed."""
+        with self._cond:
+            self._admit_or_raise(priority, self.max_wait_seconds)
+
+    def acquire(self, priority: int, session_id=None, max_wait: float | None = None):
+        """Waits for a slot for at most max_wait seconds (capped at max_wait_seconds), else raises UpstreamBusyError."""
+        waiter = _Waiter(priority, session_id)
+        started = time.monotonic()
+        max_wait = self.max_wait_seconds if max_wait is None else max(0.0, min(max_wait, self.max_wait_seconds))
+        deadline = started + max_wait
+        with self._cond:
+            self._admit_or_raise(priority, max_wait)
+            self._queues[priority].setdefault(session_id, deque()).append(waiter)
+            self._queued += 1
+            while True:
+                self._dispatch()
+                now = time.monotonic()
+                if waiter.granted:
+                    self._stats["granted"] += 1
+                    self._stats["total_wait_seconds"] += now - started
+                    return
+                if now >= deadline:
+                    self._remove(waiter)
+                    self._stats["timed_out"] += 1
+                    retry_after = self._retry_after()
+                    logger.warning(f"Upstream '{self.name}': {PRIORITY_NAMES[priority]} request waited "
+                                   f"{now - started:.1f}s without a slot. Retry after {retry_after}s.")
+                    raise UpstreamBusyError(self.name, retry_after)
+                timeout = deadline - now
+                if self._in_flight < self.max_concurrency:
+                    # Only the rate limit is holding us back: wake up when the next token is due
+                    timeout = min(timeout, max(0.01, self._bucket.seconds_until_token(now)))
+                self._cond.wait(timeout)
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: int | None = None, session_id=None, max_wait: float | None = None):
+        """Holds one upstream slot for the duration of the block. Defaults to the current scheduling context."""
+        if priority is None:
+            priority, session_id = current_context()
+        self.acquire(priority, session_id, max_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "max_concurrency": self.max_concurrency,
+                **self._stats,
+            }
+
+# --- Module-level registry, one scheduler per upstream per process ---
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(upstream: str) -> UpstreamScheduler:
+    """Returns the scheduler for an upstream, creating it from app config on first use."""
+    scheduler = _schedulers.get(upstream)
+    if scheduler is not None:
+        return scheduler
+    with _schedulers_lock:
+        if upstream not in _schedulers:
+            limits = current_app.config.get('UPSTREAM_LIMITS', {}).get(upstream, {})
+            _schedulers[upstream] = UpstreamScheduler(
+                name=upstream,
+                rate_per_second=limits.get('rate_per_second', 0),
+                burst=limits.get('burst', 1),
+                max_concurrency=limits.get('max_concurrency', 4),
+                max_queue=current_app.config.get('UPSTREAM_MAX_QUEUE', 32),
+                max_wait_seconds=current_app.config.get('UPSTREAM_MAX_WAIT_SECONDS', 10),
+            )
+            logger.info(f"Upstream scheduler '{upstream}' initialized with limits: {limits}")
+        return _schedulers[upstream]
+
+@contextmanager
+def scheduling(priority: int, session_id=None):
+    """Sets the priority class and session for upstream calls made inside the block."""
+    priority_token = _priority_var.set(priority)
+    session_token = _session_var.set(session_id)
+    try:
+        yield
+    finally:
+        _priority_var.reset(priority_token)
+        _session_var.reset(session_token)
+
+def current_context() -> tuple:
+    return _priority_var.get(), _session_var.get()
+
+def slot(upstream: str, priority: int | None = None, session_id=None, max_wait: float | None = None):
+    return get_scheduler(upstream).slot(priority, session_id, max_wait)
+
+def check_admission(upstream: str, priority: int | None = None):
+    get_scheduler(upstream).check_admission(current_context()[0] if priority is None else priority)
+
+def get_stats() -> dict:
+    return {name: scheduler.snapshot() for name, scheduler in list(_schedulers.items())}
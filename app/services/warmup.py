@@ -0,0 +1,87 @@
+# Warm-up hook: load heavy dependencies and open upstream connections before traffic is routed
+
+import socket
+import ssl
+import time
+
+from flask import current_app
+from app.services import agent_logic, deepgram_service, upstream_scheduler
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Steps the process cannot serve traffic without. Pre-connects only save latency, so they are best effort.
+REQUIRED_STEPS = ("import_dependencies", "upstream_schedulers", "llm_client", "deepgram_client")
+
+_warmed_up = False
+_last_report = None
+
+def is_warmed_up() -> bool:
+    return _warmed_up
+
+def get_last_report() -> dict | None:
+    return _last_report
+
+def _timed(report: dict, step: str, fn):
+    started = time.perf_counter()
+    try:
+        fn()
+        report[step] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+    except Exception as e:
+        logger.warning(f"Warm-up step '{step}' failed: {e}")
+        report[step] = {"ok": False, "ms": round((time.perf_counter() - started) * 1000, 1), "error": str(e)}
+
+def _import_heavy_modules():
+    import openai, PyPDF2, docx, deepgram # noqa: F401 (imported for their side effect of loading)
+
+def _build_llm_client():
+    if agent_logic.get_llm_client() is None:
+        raise RuntimeError("LLM client could not be initialized.")
+
+def _build_deepgram_client():
+    if deepgram_service.get_deepgram_client() is None:
+        raise RuntimeError("Deepgram client could not be initialized.")
+
+def _preconnect_llm():
+    # A HEAD request through the client's own pool leaves a keep-alive TLS connection for the first real call
+    if agent_logic._llm_http_client is None:
+        raise RuntimeError("LLM HTTP client not initialized.")
+    agent_logic._llm_http_client.head(agent_logic.OPENROUTER_BASE_URL, timeout=current_app.config.get('WARMUP_TIMEOUT_SECONDS', 5))
+
+def _preconnect_host(host: str):
+    # The Deepgram SDK keeps its HTTP client private, so only DNS and the TLS handshake can be warmed here
+    timeout = current_app.config.get('WARMUP_TIMEOUT_SECONDS', 5)
+    with socket.create_connection((host, 443), timeout=timeout) as sock:
+        with ssl.create_default_context().wrap_socket(sock, server_hostname=host):
+            pass
+
+def _create_schedulers():
+    for upstream in (upstream_scheduler.UPSTREAM_LLM, upstream_scheduler.UPSTREAM_DEEPGRAM):
+        upstream_scheduler.get_scheduler(upstream)
+
+def warm_up() -> dict:
+    """
+    Imports the heavy SDKs, builds the LLM and Deepgram clients, creates the upstream
+    schedulers and pre-connects to OpenRouter and Deepgram. Must run inside an app context.
+    Returns a per-step report with timings. Failed steps are reported, not raised. The process
+    only counts as warmed up when all REQUIRED_STEPS succeeded.
+    """
+    global _warmed_up, _last_report
+    logger.info("Starting warm-up...")
+    started = time.perf_counter()
+    report = {}
+    _timed(report, "import_dependencies", _import_heavy_modules)
+    _timed(report, "upstream_schedulers", _create_schedulers)
+    _timed(report, "llm_client", _build_llm_client)
+    _timed(report, "deepgram_client", _build_deepgram_client)
+    _timed(report, "llm_preconnect", _preconnect_llm)
+    _timed(report, "deepgram_preconnect", lambda: _preconnect_host(deepgram_service.DEEPGRAM_HOST))
+    ready = all(report[step]["ok"] for step in REQUIRED_STEPS)
+    _warmed_up = _warmed_up or ready
+    total_ms = round((time.perf_counter() - started) * 1000, 1)
+    if ready:
+        logger.info(f"Warm-up finished in {total_ms} ms: {report}")
+    else:
+        logger.error(f"Warm-up failed after {total_ms} ms, not ready to serve traffic: {report}")
+    _last_report = {"ok": all(step["ok"] for step in report.values()), "ready": ready, "total_ms": total_ms, "steps": report}
+    return _last_report
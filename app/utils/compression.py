@@ -0,0 +1,29 @@
+# Response compression: gzip JSON responses for clients that accept it
+
+import gzip
+
+from flask import current_app, request
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html"}
+
+def compress_response(response):
+    """
+    after_request hook. Gzips the body when the client sends Accept-Encoding: gzip and the body
+    is at least COMPRESS_MIN_BYTES. Streamed, already-encoded and error responses are left as they are.
+    """
+    config = current_app.config
+    if not config.get('COMPRESS_ENABLED', True):
+        return response
+    if response.direct_passthrough or response.status_code < 200 or response.status_code >= 300 \
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if request.accept_encodings['gzip'] <= 0:
+        return response
+
+    body = response.get_data()
+    if len(body) < config.get('COMPRESS_MIN_BYTES', 1024):
+        return response
+    response.set_data(gzip.compress(body, compresslevel=config.get('COMPRESS_LEVEL', 6)))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,46 @@
+# Upload handling: spool file parts to disk and enforce size limits while the upload is arriving
+
+from tempfile import SpooledTemporaryFile
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+class SpooledUpload(SpooledTemporaryFile):
+    """
+    Upload buffer that stays in memory up to max_memory bytes and then rolls over to a
+    temporary file. Writing more than max_bytes raises RequestEntityTooLarge, so the
+    request is rejected while the body is still being parsed.
+    """
+
+    def __init__(self, max_memory: int, max_bytes: int | None):
+        super().__init__(max_size=max_memory, mode="rb+")
+        self.max_bytes = max_bytes
+        self.bytes_written = 0
+        self._kept_open = False
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.max_bytes and self.bytes_written > self.max_bytes:
+            raise RequestEntityTooLarge(f"Uploaded file exceeds the limit of {self.max_bytes} bytes.")
+        return super().write(data)
+
+    def keep_open(self):
+        """Keeps the buffer alive after the request ends (for background jobs). Call release() when done."""
+        self._kept_open = True
+
+    def release(self):
+        self._kept_open = False
+        self.close()
+
+    def close(self):
+        if not self._kept_open:
+            super().close()
+
+class SpooledUploadRequest(Request):
+    """Request class whose file parts are SpooledUploads limited to MAX_CV_UPLOAD_BYTES."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_bytes = current_app.config.get('MAX_CV_UPLOAD_BYTES')
+        if max_bytes and content_length and content_length > max_bytes:
+            raise RequestEntityTooLarge(f"Uploaded file exceeds the limit of {max_bytes} bytes.")
+        return SpooledUpload(max_memory=current_app.config.get('UPLOAD_SPOOL_MEMORY_BYTES', 512 * 1024), max_bytes=max_bytes)
@@ -0,0 +1,55 @@
+"""
+Cold-start benchmark: measures how long a fresh interpreter takes to import the app package
+and build the Flask app, and which heavy SDKs got loaded along the way.
+
+Usage (from the repository root):
+    python benchmarks/import_time.py [--runs 5] [--config testing]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+HEAVY_MODULES = ("openai", "deepgram", "PyPDF2", "docx")
+
+# Runs in a fresh interpreter so every run is a true cold import
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app({config!r})
+created = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+def run_once(config_name: str) -> dict:
+    env = dict(os.environ, WARMUP_ON_START="false")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(config=config_name, heavy=HEAVY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--config", default="testing")
+    args = parser.parse_args()
+
+    samples = [run_once(args.config) for _ in range(args.runs)]
+    for key in ("import_ms", "create_app_ms"):
+        values = [sample[key] for sample in samples]
+        print(f"{key:>14}: median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+    print(f"{'heavy_loaded':>14}: {samples[-1]['heavy_loaded'] or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Replays recorded /api/interview turns (TRACE_RECORDING_ENABLED) through the full pipeline and
+compares the per-stage latency of the replay with the recording.
+
+Upstream modes:
+    recorded  LLM/Deepgram return the recorded outputs after the recorded latency / speedup (default)
+    stub      LLM/Deepgram return fixed outputs after --stub-latency-ms / speedup
+    live      real upstreams (needs API keys), useful to A/B prompt builders against real traffic shapes
+
+Usage (from the repository root):
+    python benchmarks/replay_traces.py traces/ [--upstream recorded] [--speedup 10] [--output results.jsonl]
+"""
+
+import argparse
+import base64
+import io
+import json
+import math
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+import wave
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+STAGES = ("cv_text_extraction", "cv_skill_extraction", "transcription", "evaluation", "question_generation", "total")
+STUB_QUESTION = "Can you describe a challenging project you worked on and your role in it?"
+# Valid for both evaluation ({score, feedback}) and CV extraction ({skills, experience_summary}) parsers
+STUB_JSON = json.dumps({"score": 3, "feedback": "Stub evaluation.", "skills": [], "experience_summary": "Stub summary."})
+
+def load_sessions(paths: list[str]) -> dict:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".jsonl"))
+        else:
+            files.append(path)
+    sessions = {}
+    for file_path in files:
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    sessions.setdefault(record["session"], []).append(record)
+    for turns in sessions.values():
+        turns.sort(key=lambda record: record["ts"])
+    return sessions
+
+class UpstreamPlayer:
+    """Serves the recorded upstream calls of the current turn, in order, per upstream."""
+
+    def __init__(self, mode: str, speedup: float, stub_latency_ms: float):
+        self.mode = mode
+        self.speedup = speedup
+        self.stub_latency_ms = stub_latency_ms
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._recorded_upstreams = set()
+        self.prompt_mismatches = 0
+
+    def load(self, upstream_calls: list[dict]):
+        with self._lock:
+            self._queues = {}
+            for call in upstream_calls:
+                self._queues.setdefault(call["upstream"], []).append(call)
+            self._recorded_upstreams = set(self._queues)
+
+    def _sleep(self, ms: float):
+        if self.speedup > 0 and ms > 0:
+            time.sleep(ms / 1000 / self.speedup)
+
+    def next_call(self, upstream: str) -> dict | None:
+        with self._lock:
+            queue = self._queues.get(upstream)
+            return queue.pop(0) if queue else None
+
+    def serve(self, upstream: str, stub_output: str, prompt_sha256: str | None = None, extra_output: str | None = None) -> str:
+        """
+        Returns the next recorded output for the upstream. Once this turn's recorded calls are used up,
+        extra calls get extra_output right away (if given), otherwise the stub after the stub latency.
+        """
+        recorded = self.next_call(upstream) if self.mode == "recorded" else None
+        if recorded is None and extra_output is not None and upstream in self._recorded_upstreams:
+            return extra_output
+        if recorded is None:
+            self._sleep(self.stub_latency_ms)
+            return stub_output
+        if prompt_sha256 and recorded.get("prompt_sha256") and recorded["prompt_sha256"] != prompt_sha256:
+            with self._lock:
+                self.prompt_mismatches += 1
+        self._sleep(recorded["duration_ms"])
+        if not recorded["ok"]:
+            raise RuntimeError(f"Recorded {upstream} call failed ({recorded.get('error')}).")
+        return recorded.get("output") or ""
+
+def _completion(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class ReplayLLMClient:
+    """Stands in for the openai client: client.chat.completions.create(...) and client.with_options(...)."""
+
+    def __init__(self, player: UpstreamPlayer):
+        self.player = player
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **_options):
+        return self
+
+    def _create(self, **kwargs):
+        from app.services import trace_recorder
+        stub = STUB_JSON if kwargs.get("response_format") else STUB_QUESTION
+        prompt_sha256 = trace_recorder.prompt_fingerprint(kwargs.get("messages", []))["prompt_sha256"]
+        return _completion(self.player.serve("llm", stub, prompt_sha256))
+
+class ReplayDeepgramClient:
+    """Stands in for DeepgramClient: client.listen.prerecorded.v("1").transcribe_file(payload, options)."""
+
+    def __init__(self, player: UpstreamPlayer):
+        self.player = player
+        endpoint = SimpleNamespace(transcribe_file=self._transcribe_file)
+        self.listen = SimpleNamespace(prerecorded=SimpleNamespace(v=lambda _version: endpoint))
+
+    def _transcribe_file(self, payload, options):
+        # A chunked transcription is recorded as one call: the first chunk to arrive gets the whole
+        # transcript after the recorded latency, the other chunks an empty string without delay
+        transcript = self.player.serve("deepgram", "I worked on a data pipeline and improved its reliability.", extra_output="")
+        return SimpleNamespace(results=SimpleNamespace(channels=[SimpleNamespace(alternatives=[SimpleNamespace(transcript=transcript)])]))
+
+def synthetic_wav_base64(seconds: float, rate: int = 16000) -> str:
+    """A tone of the recorded answer length, so chunking/silence analysis do the same amount of work."""
+    period = b"".join(struct.pack("<h", int(6000 * math.sin(2 * math.pi * i / 32))) for i in range(32))
+    frames = max(1, int(seconds * rate))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes((period * (frames // 32 + 1))[:frames * 2])
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def build_request(record: dict) -> dict:
+    inputs = record.get("inputs", {})
+    audio_seconds = (record.get("outputs", {}).get("audio_stats") or {}).get("duration_seconds") or 5.0
+    fields = {"role": inputs.get("role") or "Software Engineer"}
+    if inputs.get("audio"):
+        fields["audio"] = synthetic_wav_base64(audio_seconds)
+    if inputs.get("cv"):
+        # Only the CV size is recorded: send a plain-text placeholder of the same size
+        placeholder = (b"experience " * (inputs["cv"]["bytes"] // 11 + 1))[:inputs["cv"]["bytes"]]
+        fields["cv"] = (io.BytesIO(placeholder), "cv.txt")
+        return {"data": fields, "content_type": "multipart/form-data"}
+    return {"json": fields}
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("traces", nargs="+", help="Trace JSONL files or directories")
+    parser.add_argument("--upstream", choices=("recorded", "stub", "live"), default="recorded")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Divide upstream latencies by this factor (0 = no delays)")
+    parser.add_argument("--stub-latency-ms", type=float, default=500.0)
+    parser.add_argument("--config", default="testing")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Keep UPSTREAM_LIMITS rate limits during replay")
+    parser.add_argument("--output", help="Write per-turn comparison records to this JSONL file")
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.traces)
+    if not sessions:
+        sys.exit("No trace records found.")
+
+    os.environ["WARMUP_ON_START"] = "false"
+    from app import create_app
+    from app.api import routes
+    from app.services import agent_logic, deepgram_service
+
+    app = create_app(args.config)
+    replay_trace_dir = tempfile.mkdtemp(prefix="replay-traces-")
+    app.config.update(TRACE_RECORDING_ENABLED=True, TRACE_DIR=replay_trace_dir, TRACE_REDACTION="hash")
+    if not args.keep_rate_limits:
+        app.config["UPSTREAM_LIMITS"] = {name: dict(limits, rate_per_second=0) for name, limits in app.config["UPSTREAM_LIMITS"].items()}
+
+    player = UpstreamPlayer(args.upstream, args.speedup, args.stub_latency_ms)
+    if args.upstream != "live":
+        agent_logic._llm_client = ReplayLLMClient(player)
+        deepgram_service._deepgram_client = ReplayDeepgramClient(player)
+
+    client = app.test_client()
+    recorded_turns = []
+    for turns in sessions.values():
+        routes.cv_data_store.clear()  # Sessions are replayed one after another on the single-user state
+        for record in turns:
+            player.load(record.get("upstream_calls", []))
+            client.post("/api/interview", **build_request(record))
+            recorded_turns.append(record)
+
+    replayed_turns = load_sessions([replay_trace_dir])
+    replayed_turns = sorted((r for turns in replayed_turns.values() for r in turns), key=lambda r: r["ts"])
+
+    comparisons = []
+    for recorded, replayed in zip(recorded_turns, replayed_turns):
+        comparisons.append({
+            "session": recorded["session"],
+            "recorded_status": recorded["outputs"].get("status"),
+            "replayed_status": replayed["outputs"].get("status"),
+            "recorded_stages_ms": recorded.get("stages_ms", {}),
+            "replayed_stages_ms": replayed.get("stages_ms", {}),
+            "replayed_question_source": replayed["outputs"].get("question_source"),
+        })
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for comparison in comparisons:
+                f.write(json.dumps(comparison) + "\n")
+
+    print(f"Replayed {len(comparisons)} turns from {len(sessions)} sessions (upstream: {args.upstream}, speedup: {args.speedup}).")
+    print(f"{'stage':>20} {'n':>5} {'recorded p50':>13} {'replayed p50':>13} {'recorded p95':>13} {'replayed p95':>13}")
+    for stage in STAGES:
+        pairs = [(c["recorded_stages_ms"][stage], c["replayed_stages_ms"][stage]) for c in comparisons
+                 if stage in c["recorded_stages_ms"] and stage in c["replayed_stages_ms"]]
+        if not pairs:
+            continue
+        recorded_ms, replayed_ms = [p[0] for p in pairs], [p[1] for p in pairs]
+        print(f"{stage:>20} {len(pairs):>5} {statistics.median(recorded_ms):>13.1f} {statistics.median(replayed_ms):>13.1f} "
+              f"{percentile(recorded_ms, 95):>13.1f} {percentile(replayed_ms, 95):>13.1f}")
+    status_changes = sum(1 for c in comparisons if c["recorded_status"] != c["replayed_status"])
+    print(f"Status changes: {status_changes}. LLM prompt mismatches vs recording: {player.prompt_mismatches}.")
+
+if __name__ == "__main__":
+    main()
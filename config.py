@@ -3,7 +3,7 @@
 import os
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
+# Load environment variables from .env file (the only place .env is loaded)
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
@@ -13,6 +13,78 @@ class Config:
     DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY')
     APP_SITE_URL = os.environ.get('APP_SITE_URL') or 'http://localhost:5000'
     APP_NAME = os.environ.get('APP_NAME') or 'JobSim AI'
+
+    # Chunked transcription for long answers (see deepgram_service.transcribe_audio)
+    TRANSCRIBE_CHUNKING_ENABLED = os.environ.get('TRANSCRIBE_CHUNKING_ENABLED', 'true').lower() == 'true'
+    TRANSCRIBE_CHUNK_THRESHOLD_SECONDS = float(os.environ.get('TRANSCRIBE_CHUNK_THRESHOLD_SECONDS', 60))
+    TRANSCRIBE_CHUNK_SECONDS = float(os.environ.get('TRANSCRIBE_CHUNK_SECONDS', 30))
+    TRANSCRIBE_CHUNK_OVERLAP_SECONDS = float(os.environ.get('TRANSCRIBE_CHUNK_OVERLAP_SECONDS', 1.5))
+    TRANSCRIBE_MAX_WORKERS = int(os.environ.get('TRANSCRIBE_MAX_WORKERS', 4))
+
+    # Background CV ingestion (POST /api/cv)
+    CV_WORKER_COUNT = int(os.environ.get('CV_WORKER_COUNT', 2))
+    CV_JOB_TTL_SECONDS = float(os.environ.get('CV_JOB_TTL_SECONDS', 3600))
+
+    # Upstream admission control (see app/services/upstream_scheduler.py).
+    # rate_per_second/burst feed a token bucket, 0 disables the rate limit.
+    UPSTREAM_LIMITS = {
+        'llm': {
+            'rate_per_second': float(os.environ.get('LLM_RATE_PER_SECOND', 0.33)), # OpenRouter free tier: ~20 req/min
+            'burst': float(os.environ.get('LLM_BURST', 5)),
+            'max_concurrency': int(os.environ.get('LLM_MAX_CONCURRENCY', 4)),
+        },
+        'deepgram': {
+            'rate_per_second': float(os.environ.get('DEEPGRAM_RATE_PER_SECOND', 0)),
+            'burst': float(os.environ.get('DEEPGRAM_BURST', 10)),
+            'max_concurrency': int(os.environ.get('DEEPGRAM_MAX_CONCURRENCY', 8)),
+        },
+    }
+    UPSTREAM_MAX_QUEUE = int(os.environ.get('UPSTREAM_MAX_QUEUE', 32))
+    UPSTREAM_MAX_WAIT_SECONDS = float(os.environ.get('UPSTREAM_MAX_WAIT_SECONDS', 10))
+
+    # Single-flight coalescing of identical in-flight LLM calls (see app/services/single_flight.py)
+    SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLE_FLIGHT_MAX_TEMPERATURE = float(os.environ.get('SINGLE_FLIGHT_MAX_TEMPERATURE', 0.3))
+
+    # Warm-up (see app/services/warmup.py). Run it in create_app or via POST /api/warmup.
+    WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'false').lower() == 'true'
+    WARMUP_TIMEOUT_SECONDS = float(os.environ.get('WARMUP_TIMEOUT_SECONDS', 5))
+
+    # Degraded mode: template questions when the LLM is slow or failing (see app/services/degraded_mode.py)
+    DEGRADED_MODE_ENABLED = os.environ.get('DEGRADED_MODE_ENABLED', 'true').lower() == 'true'
+    QUESTION_LATENCY_BUDGET_SECONDS = float(os.environ.get('QUESTION_LATENCY_BUDGET_SECONDS', 8))
+    DEGRADED_ERROR_RATE_THRESHOLD = float(os.environ.get('DEGRADED_ERROR_RATE_THRESHOLD', 0.5))
+    DEGRADED_WINDOW_SIZE = int(os.environ.get('DEGRADED_WINDOW_SIZE', 10))
+    DEGRADED_MIN_SAMPLES = int(os.environ.get('DEGRADED_MIN_SAMPLES', 4))
+    DEGRADED_COOLDOWN_SECONDS = float(os.environ.get('DEGRADED_COOLDOWN_SECONDS', 30))
+
+    # Local triage of degenerate answers before LLM evaluation (see app/services/answer_triage.py)
+    ANSWER_TRIAGE_ENABLED = os.environ.get('ANSWER_TRIAGE_ENABLED', 'true').lower() == 'true'
+
+    # Upload limits. Files stay in memory up to UPLOAD_SPOOL_MEMORY_BYTES, then spool to a temp file.
+    MAX_CV_UPLOAD_BYTES = int(os.environ.get('MAX_CV_UPLOAD_BYTES', 5 * 1024 * 1024))
+    MAX_CV_PAGES = int(os.environ.get('MAX_CV_PAGES', 10))
+    UPLOAD_SPOOL_MEMORY_BYTES = int(os.environ.get('UPLOAD_SPOOL_MEMORY_BYTES', 512 * 1024))
+    # The whole-request limit is sized for the largest base64 answer recording plus a CV, so long answers still fit
+    MAX_AUDIO_BYTES = int(os.environ.get('MAX_AUDIO_BYTES', 100 * 1024 * 1024)) # Decoded audio, e.g. ~18 min of 48 kHz mono 16-bit WAV
+    MAX_FORM_MEMORY_SIZE = int(os.environ.get('MAX_FORM_MEMORY_SIZE', MAX_AUDIO_BYTES * 4 // 3 + 64 * 1024)) # Non-file form fields (base64 audio)
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', MAX_FORM_MEMORY_SIZE + MAX_CV_UPLOAD_BYTES + 1024 * 1024))
+
+    # Opt-in turn trace recording for offline replay (see app/services/trace_recorder.py, benchmarks/replay_traces.py)
+    TRACE_RECORDING_ENABLED = os.environ.get('TRACE_RECORDING_ENABLED', 'false').lower() == 'true'
+    TRACE_DIR = os.environ.get('TRACE_DIR') or os.path.join(basedir, 'traces')
+    TRACE_REDACTION = os.environ.get('TRACE_REDACTION', 'hash') # 'hash' or 'strict'
+
+    # End-of-interview report (see app/services/interview_report.py)
+    REPORT_NARRATIVE_ENABLED = os.environ.get('REPORT_NARRATIVE_ENABLED', 'true').lower() == 'true'
+    REPORT_NARRATIVE_CACHE_SIZE = int(os.environ.get('REPORT_NARRATIVE_CACHE_SIZE', 256))
+
+    # Response payloads. 'compact' leaves out debug fields; clients can ask for 'verbose' with ?debug=true.
+    RESPONSE_FORMAT = os.environ.get('RESPONSE_FORMAT', 'compact') # 'compact' or 'verbose'
+    VERBOSE_RESPONSES_ALLOWED = os.environ.get('VERBOSE_RESPONSES_ALLOWED', 'true').lower() == 'true'
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
     # Add other global configurations here
 
     @staticmethod
@@ -37,6 +109,8 @@ class TestingConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'true').lower() == 'true'
+    VERBOSE_RESPONSES_ALLOWED = os.environ.get('VERBOSE_RESPONSES_ALLOWED', 'false').lower() == 'true' # No raw LLM output to clients
     # Production-specific configurations
     # For example, to use a production database:
     # SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')